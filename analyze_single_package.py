@@ -1,9 +1,11 @@
 from pathlib import Path
+from typing import Optional
 import time
 from analyzers import PackageAnalyzer
-from utils import FileHandler, synchronized_print
+from models import AnalysisOptions
+from utils import FileHandler, ProgressManifest, synchronized_print
 
-def analyze_single_package(package: str, out_dir: str, package_index: int, total_packages: int, include_local: bool, local_dir: str, workers: int) -> None:
+def analyze_single_package(package: str, out_dir: str, package_index: int, total_packages: int, include_local: bool, local_dir: str, workers: int, options: Optional[AnalysisOptions] = None) -> None:
     """Analyze a single npm package"""
     pkg_dir = Path(out_dir) / package.replace('/', '_')
     pkg_dir.mkdir(parents=True, exist_ok=True)
@@ -11,10 +13,13 @@ def analyze_single_package(package: str, out_dir: str, package_index: int, total
     start_time = time.time()
     synchronized_print(f"[{package_index}/{total_packages}] Analyzing {package}...")
     
-    analyzer = PackageAnalyzer(include_local=include_local, local_versions_dir=local_dir, workers=workers, package_name=package, output_dir=pkg_dir)
-    analyzer.analyze_package()
+    analyzer = PackageAnalyzer(include_local=include_local, local_versions_dir=local_dir, workers=workers, package_name=package, output_dir=pkg_dir, options=options)
+    completed = analyzer.analyze_package()
     
     FileHandler().delete_exctracted_dir(package)
+    # A package stopped by an error is not recorded, --resume analyzes its missing versions again
+    if completed and options is not None and options.progress_path:
+        ProgressManifest(options.progress_path).record_package(package)
 
     elapsed_time = time.time() - start_time
     synchronized_print(f"[{package_index}/{total_packages}] Completed: {package} ({elapsed_time:.1f}s)")
\ No newline at end of file
@@ -1,4 +1,4 @@
 from .package_analyzer import PackageAnalyzer
-from .metrics_aggregator import MetricsAggregator
+from .metrics_aggregator import MetricsAggregator, VersionAccumulator
 
-__all__ = ['PackageAnalyzer', 'MetricsAggregator']
\ No newline at end of file
+__all__ = ['PackageAnalyzer', 'MetricsAggregator', 'VersionAccumulator']
\ No newline at end of file
@@ -1,6 +1,7 @@
 import re
-from typing import List, Pattern
-from utils import UtilsForAnalyzer
+from typing import Dict, List, Optional, Pattern
+from utils import PatternSet, UtilsForAnalyzer
+from models import MatchTally
 from models.domains import CryptoMetrics
 from utils import synchronized_print
 class CryptojackingAnalyzer:
@@ -84,20 +85,45 @@ class CryptojackingAnalyzer:
         re.compile(r'\b(eth_sendTransaction|solana_signTransaction|solana_signAndSendTransaction)\b', re.IGNORECASE),
     ]
     """
-    def analyze(self, content: str) -> CryptoMetrics:
+    # Pattern groups scanned in a single pass, by the CodeAnalyzer for all the categories together
+    PATTERNS: Dict[str, List[Pattern]] = {
+        'crypto_addresses': CRYPTO_PATTERNS,
+        #'cryptocurrency_names': CRYPTOCURRENCY_NAMES,
+        #'wallet_detection': WALLET_DETECTION_PATTERNS,
+        #'replaced_crypto_addresses': REPLACE_CRYPTO_ADDRESS_PATTERN,
+    }
+
+    def __init__(self):
+        self.pattern_set = PatternSet(self.PATTERNS)
+
+    def analyze(self, content: str, matches: Optional[Dict[str, List[str]]] = None) -> CryptoMetrics:
         crypto = CryptoMetrics()
+        if matches is None:
+            matches = self.pattern_set.scan(content)
 
-        crypto.crypto_addresses, crypto.list_crypto_addresses = UtilsForAnalyzer.detect_patterns(content, self.CRYPTO_PATTERNS)
-        crypto.len_list_crypto_addresses_unique = len(set(crypto.list_crypto_addresses))
+        found = matches['crypto_addresses']
+        if isinstance(found, MatchTally):
+            # Summarized while scanned (sketch_top_k), see CodeAnalyzer._tallies
+            crypto.list_crypto_addresses = found.values()
+            crypto.crypto_addresses = len(found)
+            crypto.len_list_crypto_addresses_unique = found.unique()
+            crypto.crypto_addresses_sketch = found.sketch
+        else:
+            crypto.list_crypto_addresses = found
+            crypto.crypto_addresses = len(crypto.list_crypto_addresses)
+            crypto.len_list_crypto_addresses_unique = len(set(crypto.list_crypto_addresses))
         #TEST
         """
-        crypto.cryptocurrency_name, crypto.list_cryptocurrency_names = UtilsForAnalyzer.detect_patterns(content, self.CRYPTOCURRENCY_NAMES)
+        crypto.list_cryptocurrency_names = matches['cryptocurrency_names']
+        crypto.cryptocurrency_name = len(crypto.list_cryptocurrency_names)
         crypto.len_list_cryptocurrency_names_unique = len(set(crypto.list_cryptocurrency_names))
-        crypto.wallet_detection, crypto.wallet_detection_list = UtilsForAnalyzer.detect_patterns(content, self.WALLET_DETECTION_PATTERNS)
+        crypto.wallet_detection_list = matches['wallet_detection']
+        crypto.wallet_detection = len(crypto.wallet_detection_list)
         # Mechanism present in the malware considered :
         #   Intercepts all HTTP responses (fetch/XMLHttpRequest) and replaces the crypto addresses found in the content with those controlled by the attacker
         # Check presence of cryptocurrency name and .replace function could indicate address substitution
-        crypto.replaced_crypto_addresses, crypto.replaced_crypto_addresses_list = UtilsForAnalyzer.detect_patterns(content, self.REPLACE_CRYPTO_ADDRESS_PATTERN)
+        crypto.replaced_crypto_addresses_list = matches['replaced_crypto_addresses']
+        crypto.replaced_crypto_addresses = len(crypto.replaced_crypto_addresses_list)
         crypto.hook_provider = UtilsForAnalyzer.detect_count_patterns(content, self.HOOK_PROVIDER_PATTERN)
         """
         return crypto
\ No newline at end of file
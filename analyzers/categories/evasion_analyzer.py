@@ -1,6 +1,7 @@
 import re
-from typing import List, Pattern
-from utils import UtilsForAnalyzer
+from typing import Dict, List, Optional, Pattern
+from utils import PatternSet
+from models import MatchTally
 from models.domains import EvasionMetrics
 from utils import synchronized_print
 class EvasionAnalyzer:
@@ -45,14 +46,35 @@ class EvasionAnalyzer:
         ),
     '''
 
-    def analyze(self, content: str, longest_line_length: int) -> EvasionMetrics:
+    # Pattern groups scanned in a single pass, by the CodeAnalyzer for all the categories together
+    PATTERNS: Dict[str, List[Pattern]] = {
+        'obfuscation_patterns': OBFUSCATION_PATTERNS,
+        #'platform_detections': PLATFORM_PATTERNS,
+    }
+
+    def __init__(self):
+        self.pattern_set = PatternSet(self.PATTERNS)
+
+    def analyze(self, content: str, longest_line_length: int, matches: Optional[Dict[str, List[str]]] = None) -> EvasionMetrics:
         evasion = EvasionMetrics()
+        if matches is None:
+            matches = self.pattern_set.scan(content)
 
-        evasion.obfuscation_patterns_count, evasion.list_obfuscation_patterns = UtilsForAnalyzer.detect_patterns(content, self.OBFUSCATION_PATTERNS)
-        evasion.len_list_obfuscation_patterns_unique = len(set(evasion.list_obfuscation_patterns))
+        found = matches['obfuscation_patterns']
+        if isinstance(found, MatchTally):
+            # Summarized while scanned (sketch_top_k), see CodeAnalyzer._tallies
+            evasion.list_obfuscation_patterns = found.values()
+            evasion.obfuscation_patterns_count = len(found)
+            evasion.len_list_obfuscation_patterns_unique = found.unique()
+            evasion.obfuscation_patterns_sketch = found.sketch
+        else:
+            evasion.list_obfuscation_patterns = found
+            evasion.obfuscation_patterns_count = len(evasion.list_obfuscation_patterns)
+            evasion.len_list_obfuscation_patterns_unique = len(set(evasion.list_obfuscation_patterns))
         #TEST
         """
-        evasion.platform_detections_count, evasion.list_platform_detections = UtilsForAnalyzer.detect_patterns(content, self.PLATFORM_PATTERNS)
+        evasion.list_platform_detections = matches['platform_detections']
+        evasion.platform_detections_count = len(evasion.list_platform_detections)
         evasion.len_list_platform_detections_unique = len(set(evasion.list_platform_detections))
         evasion.possible_obfuscated = self._detect_obfuscated_code(evasion.obfuscation_patterns_count, longest_line_length)
         """
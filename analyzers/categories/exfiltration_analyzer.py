@@ -1,6 +1,6 @@
 import re
-from typing import List, Pattern
-from utils import UtilsForAnalyzer
+from typing import Dict, List, Optional, Pattern
+from utils import PatternSet
 from models.domains import ExfiltrationMetrics
 from utils import synchronized_print
 
@@ -61,13 +61,28 @@ class ExfiltrationAnalyzer:
         re.compile(r'new\s+WebSocket\s*\(\s*[\'"]?(wss?:\/\/[^\s\'"]+)[\'"]?', re.IGNORECASE),
     ]
 
-    def analyze(self, content: str) -> ExfiltrationMetrics:
+    # Pattern groups scanned in a single pass, by the CodeAnalyzer for all the categories together
+    PATTERNS: Dict[str, List[Pattern]] = {
+        'scan_functions': SCAN_FUNCTIONS_PATTERNS,
+        'sensitive_elements': SCANNED_ELEMENTS_PATTERNS,
+        'data_transmissions': DATA_TRANSMISSION_PATTERNS,
+    }
+
+    def __init__(self):
+        self.pattern_set = PatternSet(self.PATTERNS)
+
+    def analyze(self, content: str, matches: Optional[Dict[str, List[str]]] = None) -> ExfiltrationMetrics:
         exfiltration = ExfiltrationMetrics()
+        if matches is None:
+            matches = self.pattern_set.scan(content)
 
-        exfiltration.scan_functions_count,  exfiltration.list_scan_functions = UtilsForAnalyzer.detect_patterns(content, self.SCAN_FUNCTIONS_PATTERNS)
+        exfiltration.list_scan_functions = matches['scan_functions']
+        exfiltration.scan_functions_count = len(exfiltration.list_scan_functions)
         exfiltration.len_list_scan_functions_unique = len(set(exfiltration.list_scan_functions))
-        exfiltration.sensitive_elements_count, exfiltration.list_sensitive_elements = UtilsForAnalyzer.detect_patterns(content, self.SCANNED_ELEMENTS_PATTERNS)
+        exfiltration.list_sensitive_elements = matches['sensitive_elements']
+        exfiltration.sensitive_elements_count = len(exfiltration.list_sensitive_elements)
         exfiltration.len_list_sensitive_elements_unique = len(set(exfiltration.list_sensitive_elements))
-        exfiltration.data_transmission_count, exfiltration.list_data_transmissions = UtilsForAnalyzer.detect_patterns(content, self.DATA_TRANSMISSION_PATTERNS)
+        exfiltration.list_data_transmissions = matches['data_transmissions']
+        exfiltration.data_transmission_count = len(exfiltration.list_data_transmissions)
         exfiltration.len_list_data_transmissions_unique = len(set(exfiltration.list_data_transmissions))
         return exfiltration
\ No newline at end of file
@@ -1,69 +1,53 @@
 #import math
-#from typing import Tuple
+from typing import Optional, Tuple
+import numpy as np
 from models.domains import GenericMetrics
 #from models import CodeType
 #import jsbeautifier
 
 class GenericAnalyzer:
     """Obtain generic metrics from files"""
-    """
-    def pre_analyze_js(self, content: str) -> Tuple[int, int, float, float, int, int]:
-        #Pre-analyze JavaScript code to get basic metrics before comment removal
-        num_chars = len(content)
-        num_lines = self._count_non_blank_lines(content)
-        entropy = self._calculate_shannon_entropy(content)
-        ws_ratio, num_ws, num_printable = self._compute_whitespace_ratio(content)
-        return num_chars, num_lines, entropy, ws_ratio, num_ws, num_printable
-    """
-    def analyze(self, content) -> GenericMetrics:
-        """
-        : str, num_chars: int, num_lines: int, 
-                num_comments: int, entropy_orig: float, ws_ratio_orig: float,
-                num_ws: int, num_printable: int) -> GenericMetrics:
-        """
-        #Analyze content and return generic metrics
+
+    # Whitespace (str.isspace) and line breaks (str.splitlines) by code point, all of them are below U+3001.
+    # Larger code points are looked up in the last entry, which is neither
+    TABLE_SIZE = 0x3002
+    WHITESPACE = np.array([chr(c).isspace() for c in range(TABLE_SIZE - 1)] + [False])
+    LINE_BREAKS = np.array([len(f"a{chr(c)}b".splitlines()) == 2 for c in range(TABLE_SIZE - 1)] + [False])
+
+    def pre_analyze_js(self, content) -> Tuple[int, int, float, int, int, int]:
+        """Metrics of JavaScript code before comment removal, same as _text_metrics"""
+        return self._text_metrics(content)
+
+    def analyze(self, content, num_comments: int = 0, pre_metrics: Optional[Tuple[int, int, float, int, int, int]] = None) -> GenericMetrics:
+        """Analyze content (without comments) and return generic metrics.
+        pre_metrics are the metrics of the original content, None if nothing was removed from it"""
         metrics = GenericMetrics()
-        
-        #TEST
-        """
+
+        num_chars, num_lines, entropy, num_ws, num_printable, longest_line = self._text_metrics(content)
+        if pre_metrics is None:
+            pre_metrics = num_chars, num_lines, entropy, num_ws, num_printable, longest_line
+        num_chars_orig, num_lines_orig, entropy_orig, num_ws_orig, num_printable_orig, _ = pre_metrics
+
         # Basic character and line counts
-        metrics.number_of_characters = num_chars if num_chars > 0 else len(content)
-        metrics.number_of_characters_no_comments = len(content)
-        
-        metrics.total_number_of_non_blank_lines = num_lines if num_lines > 0 else self._count_non_blank_lines(content)
-        metrics.number_of_non_blank_lines_no_comments = self._count_non_blank_lines(content)
-        
+        metrics.number_of_characters = num_chars_orig
+        metrics.number_of_characters_no_comments = num_chars
+        metrics.total_number_of_non_blank_lines = num_lines_orig
+        metrics.number_of_non_blank_lines_no_comments = num_lines
         metrics.number_of_comments = num_comments
-        
+
         # Entropy: original vs no_comments
-        if entropy_orig > 0:
-            metrics.shannon_entropy_original = entropy_orig
-            metrics.shannon_entropy_no_comments = self._calculate_shannon_entropy(content)
-        else:
-            metrics.shannon_entropy_original = self._calculate_shannon_entropy(content)
-            metrics.shannon_entropy_no_comments = metrics.shannon_entropy_original
-        
+        metrics.shannon_entropy_original = entropy_orig
+        metrics.shannon_entropy_no_comments = entropy
+
         # Whitespace ratio: original vs no_comments
-        if ws_ratio_orig > 0:
-            metrics.blank_space_and_character_ratio_original = ws_ratio_orig
-            ws_ratio_nc, num_ws_nc, num_p_nc = self._compute_whitespace_ratio(content)
-            metrics.blank_space_and_character_ratio_no_comments = ws_ratio_nc
-            
-            metrics.number_of_whitespace_characters = num_ws
-            metrics.number_of_whitespace_characters_no_comments = num_ws_nc
-            metrics.number_of_printable_characters = num_printable
-            metrics.number_of_printable_characters_no_comments = num_p_nc
-        else:
-            ws_ratio, ws_count, p_count = self._compute_whitespace_ratio(content)
-            metrics.blank_space_and_character_ratio_original = ws_ratio
-            metrics.blank_space_and_character_ratio_no_comments = ws_ratio
-            
-            metrics.number_of_whitespace_characters = ws_count
-            metrics.number_of_whitespace_characters_no_comments = ws_count
-            metrics.number_of_printable_characters = p_count
-            metrics.number_of_printable_characters_no_comments = p_count
-        """
-        metrics.longest_line_length_no_comments = max((len(line) for line in content.splitlines()), default=0)
+        metrics.blank_space_and_character_ratio_original = self._whitespace_ratio(num_ws_orig, num_printable_orig)
+        metrics.blank_space_and_character_ratio_no_comments = self._whitespace_ratio(num_ws, num_printable)
+        metrics.number_of_whitespace_characters = num_ws_orig
+        metrics.number_of_whitespace_characters_no_comments = num_ws
+        metrics.number_of_printable_characters = num_printable_orig
+        metrics.number_of_printable_characters_no_comments = num_printable
+
+        metrics.longest_line_length_no_comments = longest_line
         """
         # Detect if code is minified
         is_minified = self._detect_minified_code(
@@ -92,6 +76,49 @@ class GenericAnalyzer:
         metrics.is_plain_text_file = True
         
         return metrics
+
+    def _text_metrics(self, content) -> Tuple[int, int, float, int, int, int]:
+        """(characters, non blank lines, Shannon entropy, whitespace characters, printable characters, longest line).
+        Computed together on an array of the characters: the bytes of bytes content (ASCII, one byte per character),
+        the code points of text. Lines are those of str.splitlines"""
+        if isinstance(content, str):
+            characters = np.frombuffer(content.encode("utf-32-le", "surrogatepass"), dtype="<u4")
+            counts = np.unique(characters, return_counts=True)[1]
+            characters = np.minimum(characters, self.TABLE_SIZE - 1)
+        else:
+            characters = np.frombuffer(content, dtype=np.uint8)
+            counts = np.bincount(characters)
+        length = len(characters)
+        if not length:
+            return 0, 0, 0.0, 0, 0, 0
+
+        # Entropy: H = -sum(p(x) * log2(p(x))), p(x) probability of character x
+        probabilities = counts[counts > 0] / length
+        entropy = float(-(probabilities * np.log2(probabilities)).sum())
+
+        is_whitespace = self.WHITESPACE[characters]
+        is_break = self.LINE_BREAKS[characters]
+        whitespace_count = int(np.count_nonzero(is_whitespace))
+
+        # Lengths of the lines between consecutive breaks (a \r\n pair only adds an empty line)
+        breaks = np.flatnonzero(is_break)
+        longest_line = int((np.diff(breaks, prepend=-1, append=length) - 1).max())
+
+        # Line breaks and non whitespace characters in order: a line is not blank if a character precedes its break
+        is_break = is_break[~is_whitespace | is_break]
+        non_blank_lines = int(np.count_nonzero(~is_break[:-1] & is_break[1:]))
+        if len(is_break) and not is_break[-1]:
+            non_blank_lines += 1
+
+        return length, non_blank_lines, entropy, whitespace_count, length - whitespace_count, longest_line
+
+    @staticmethod
+    def _whitespace_ratio(whitespace_count: int, printable_count: int) -> float:
+        #Ratio = W / P
+        #    where:
+        #    - W = number of whitespace characters (spaces, tabs, newlines)
+        #    - P = number of printable (non-whitespace) characters
+        return whitespace_count / printable_count if printable_count > 0 else float("inf")
     """
     def _count_non_blank_lines(self, content: str) -> int:
         #Count lines that contain at least one non-whitespace character
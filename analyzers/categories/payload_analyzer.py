@@ -1,6 +1,6 @@
 import re
-from typing import Dict, List, Pattern
-from utils import UtilsForAnalyzer
+from typing import Dict, List, Optional, Pattern
+from utils import PatternSet
 from utils import synchronized_print
 from models.domains import PayloadMetrics
 
@@ -51,18 +51,34 @@ class PayloadAnalyzer:
 
     PREINSTALL_PATTERNS: List[Pattern] = [re.compile(r'"preinstall"\s*:\s*"[^"]*"\s*,?', re.IGNORECASE)]    # [^"]*  Any text between quotes
     
-    def analyze(self, content: str, package_info: Dict) -> PayloadMetrics:
+    # Pattern groups scanned in a single pass, by the CodeAnalyzer for all the categories together
+    PATTERNS: Dict[str, List[Pattern]] = {
+        'timing_delays': TIMING_DELAYS_PATTERNS,
+        'eval': EVAL_PATTERNS,
+        'shell_commands': SHELL_COMMANDS_PATTERNS,
+        'preinstall_scripts': PREINSTALL_PATTERNS,
+    }
+
+    def __init__(self):
+        self.pattern_set = PatternSet(self.PATTERNS)
+
+    def analyze(self, content: str, package_info: Dict, matches: Optional[Dict[str, List[str]]] = None) -> PayloadMetrics:
         payload = PayloadMetrics()
+        if matches is None:
+            matches = self.pattern_set.scan(content)
         
-        payload.timing_delays_count, payload.list_timing_delays = UtilsForAnalyzer.detect_patterns(content, self.TIMING_DELAYS_PATTERNS)
+        payload.list_timing_delays = matches['timing_delays']
+        payload.timing_delays_count = len(payload.list_timing_delays)
         payload.len_list_timing_delays_unique = len(set(payload.list_timing_delays))
-        payload.eval_count, payload.list_eval = UtilsForAnalyzer.detect_patterns(content, self.EVAL_PATTERNS)
+        payload.list_eval = matches['eval']
+        payload.eval_count = len(payload.list_eval)
         payload.len_list_eval_unique = len(set(payload.list_eval))
-        payload.shell_commands_count, payload.list_shell_commands = UtilsForAnalyzer.detect_patterns(content, self.SHELL_COMMANDS_PATTERNS)
+        payload.list_shell_commands = matches['shell_commands']
+        payload.shell_commands_count = len(payload.list_shell_commands)
         payload.len_list_shell_commands_unique = len(set(payload.list_shell_commands))
 
         if(package_info['file_name'] == 'package.json'):
-            _, preinstall_scripts = UtilsForAnalyzer.detect_patterns(content, self.PREINSTALL_PATTERNS)
+            preinstall_scripts = matches['preinstall_scripts']
             #Take only the first occurrence, there should be only one preinstall script in package.json
             if preinstall_scripts:
                 payload.preinstall_scripts = [preinstall_scripts[0]]
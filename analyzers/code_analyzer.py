@@ -1,11 +1,28 @@
-from pathlib import Path
-from typing import Dict#, Tuple
+import hashlib
+import mmap
+from pathlib import Path, PurePath
+from typing import Dict, List, Optional, Tuple, Union
 from .categories import EvasionAnalyzer, CryptojackingAnalyzer, GenericAnalyzer #PayloadAnalyzer, ExfiltrationAnalyzer,
+from models import MatchSketch, MatchTally
 from models.composed_metrics import FileMetrics
-from utils import FileHandler, FileTypeDetector, UtilsForAnalyzer #synchronized_print,
+from utils import FileHandler, FileTypeDetector, ParsedFile, PatternSet, UtilsForAnalyzer, synchronized_print
 
 class CodeAnalyzer:
     """Coordinates analysis across all categories"""
+
+    # Bump when the analysis logic changes in a way that is not visible in the patterns
+    ANALYZER_VERSION = "4"
+
+    # Matches kept per pattern and file, the rest of a pathological file (e.g. a minified table of hex literals) is dropped
+    MAX_MATCHES = 100000
+
+    # Pattern groups of the active categories, scanned together in a single pass over the content
+    PATTERN_GROUPS = {
+        **EvasionAnalyzer.PATTERNS,
+        #**PayloadAnalyzer.PATTERNS,
+        #**ExfiltrationAnalyzer.PATTERNS,
+        **CryptojackingAnalyzer.PATTERNS,
+    }
     
     def __init__(self):
         self.generic_analyzer = GenericAnalyzer()
@@ -13,66 +30,147 @@ class CodeAnalyzer:
         #self.payload_analyzer = PayloadAnalyzer()
         #self.exfiltration_analyzer = ExfiltrationAnalyzer()
         self.cryptojacking_analyzer = CryptojackingAnalyzer()
+        self.pattern_set = PatternSet(self.PATTERN_GROUPS, max_matches=self.MAX_MATCHES)
 
-    def analyze_file(self, file_path: Path, package_info: Dict) -> FileMetrics:
-        """Analyze a single file and return all metrics"""
-        metrics = FileMetrics(
-            package=package_info['name'],
-            version=package_info['version'],
-            file_path=package_info['file_name'],
+    def analyze(self, source: Union[Path, bytes], package_info: Dict, file_type: Optional[str] = None, sketch_top_k: int = 0) -> FileMetrics:
+        """Analyze a file on disk or the in-memory content of a tarball member.
+        The file type is detected here unless it was already detected for a whole batch.
+        With sketch_top_k the match lists are summarized while they are scanned, see _tallies"""
+        if isinstance(source, (bytes, bytearray)):
+            return self.analyze_bytes(source, package_info, file_type, sketch_top_k)
+        return self.analyze_file(source, package_info, file_type, sketch_top_k)
+
+    @staticmethod
+    def _tallies(k: int) -> Optional[Dict[str, MatchTally]]:
+        """Collectors of the sketched match lists, merged into the version sketches (see VersionAccumulator). A list of
+        more than k matches is replaced by its k most frequent distinct matches, so a heavily obfuscated file holds a
+        bounded number of strings, also while it is scanned; shorter lists are kept as they are. The match counts of
+        the file are exact, the unique counts are estimated beyond k distinct matches"""
+        if not k:
+            return None
+        return {name: MatchTally(k) for name in ('obfuscation_patterns', 'crypto_addresses')}
+
+    @staticmethod
+    def detect_file_types(tasks: List[Tuple[Union[Path, bytes], Dict, Optional[str], Optional[str]]],
+                          fast_path: str = 'magic', batch_size: int = 1) -> List[str]:
+        """File types of a batch of (file path or content, package info, content hash, known type) tasks.
+        Types already known are kept, the others are identified together"""
+        file_types = [file_type for _, _, _, file_type in tasks]
+        unknown = [i for i, file_type in enumerate(file_types) if file_type is None]
+        detected = FileTypeDetector.detect_file_types(
+            [tasks[i][0] for i in unknown],
+            [tasks[i][1]['file_name'] for i in unknown],
+            fast_path,
+            batch_size,
+            [tasks[i][2] for i in unknown],
         )
-        
-        file_type = FileTypeDetector.detect_file_type(file_path)
+        for i, file_type in zip(unknown, detected):
+            file_types[i] = file_type
+        return file_types
+
+    def analyze_file(self, file_path: Path, package_info: Dict, file_type: Optional[str] = None, sketch_top_k: int = 0) -> FileMetrics:
+        """Analyze a single file and return all metrics"""
+        if file_type is None:
+            file_type = FileTypeDetector.detect_file_type(file_path)
         size_bytes = file_path.stat().st_size
         
         if not FileTypeDetector.is_valid_file_for_analysis(file_type):
             #synchronized_print(f"   Skipping non-valid file: {file_path.name} (type: {file_type})")
-            metrics.generic.file_type = file_type
-            metrics.generic.size_bytes = size_bytes
-            metrics.generic.is_plain_text_file = False
-            return metrics
+            return self._analyze_content("", file_type, size_bytes, package_info, sketch_top_k)
+        
+        #content = FileHandler().read_file(file_path)
+        try:
+            with FileHandler.map_file(file_path) as buffer:
+                return self._analyze_buffer(buffer, file_type, size_bytes, package_info, sketch_top_k)
+        except OSError as e:
+            synchronized_print(f"Error reading {file_path}: {e}")
+            return self._analyze_content("", file_type, size_bytes, package_info, sketch_top_k)
+
+    def analyze_bytes(self, data: bytes, package_info: Dict, file_type: Optional[str] = None, sketch_top_k: int = 0) -> FileMetrics:
+        """Analyze the content of a file that was never written to disk"""
+        if file_type is None:
+            file_type = FileTypeDetector.detect_bytes_type(data)
+        
+        if not FileTypeDetector.is_valid_file_for_analysis(file_type):
+            return self._analyze_content("", file_type, len(data), package_info, sketch_top_k)
         
-        content = FileHandler().read_file(file_path)
+        return self._analyze_buffer(data, file_type, len(data), package_info, sketch_top_k)
+
+    def _analyze_buffer(self, buffer: Union[bytes, mmap.mmap], file_type: str, size_bytes: int, package_info: Dict, sketch_top_k: int = 0) -> FileMetrics:
+        """ASCII content is analyzed as bytes, without decoding it (a mapped JS file is also parsed in place),
+        any other content is decoded first"""
+        if not UtilsForAnalyzer.is_byte_exact(buffer):
+            content = FileHandler.decode_content(bytes(buffer), package_info['file_name'])
+            return self._analyze_content(content, file_type, size_bytes, package_info, sketch_top_k)
+        if not FileTypeDetector.is_js_like_file(file_type):
+            # Scanned as is, copied out of the mapping (bytes are not copied)
+            buffer = bytes(buffer)
+        return self._analyze_content(buffer, file_type, size_bytes, package_info, sketch_top_k)
+
+    def _analyze_content(self, content: Union[str, bytes], file_type: str, size_bytes: int, package_info: Dict, sketch_top_k: int = 0) -> FileMetrics:
+        metrics = FileMetrics(
+            package=package_info['name'],
+            version=package_info['version'],
+            file_path=package_info['file_name'],
+        )
+
+        tallies = self._tallies(sketch_top_k)
         if not content:
             #ynchronized_print(f"   Empty content: {file_path.name}")
             metrics.generic.file_type = file_type
             metrics.generic.size_bytes = size_bytes
             metrics.generic.is_plain_text_file = False
+            if tallies:
+                # Every file of a sketched version has its sketches, empty ones here
+                metrics.evasion.obfuscation_patterns_sketch = tallies['obfuscation_patterns'].sketch
+                metrics.crypto.crypto_addresses_sketch = tallies['crypto_addresses'].sketch
             return metrics
         
         # Pre-process content
         #processed_content, pre_metrics = self._preprocess_content(content, file_path, file_type)
-        processed_content = self._preprocess_content(content, file_path, file_type)
+        file_name = PurePath(package_info['file_name']).name
+        # Parsed once, the tree is shared by comment removal and any AST based analysis
+        parsed = ParsedFile(content, file_name) if FileTypeDetector.is_js_like_file(file_type) else None
+        processed_content, pre_metrics = self._preprocess_content(content, file_name, file_type, parsed)
 
         # Analyze all categories
-        metrics.generic = self.generic_analyzer.analyze(processed_content)#, *pre_metrics)
-        metrics.evasion = self.evasion_analyzer.analyze(processed_content, metrics.generic.longest_line_length_no_comments)
-        #metrics.payload = self.payload_analyzer.analyze(processed_content, package_info)
-        #metrics.exfiltration = self.exfiltration_analyzer.analyze(processed_content)
-        metrics.crypto = self.cryptojacking_analyzer.analyze(processed_content)
+        matches = self.pattern_set.scan(processed_content, tallies)
+        metrics.generic = self.generic_analyzer.analyze(processed_content, *pre_metrics)
+        metrics.evasion = self.evasion_analyzer.analyze(processed_content, metrics.generic.longest_line_length_no_comments, matches)
+        #metrics.payload = self.payload_analyzer.analyze(processed_content, package_info, matches)
+        #metrics.exfiltration = self.exfiltration_analyzer.analyze(processed_content, matches)
+        metrics.crypto = self.cryptojacking_analyzer.analyze(processed_content, matches)
         
         metrics.generic.file_type = file_type
         metrics.generic.size_bytes = size_bytes
         return metrics
     
-    def _preprocess_content(self, content: str, file_path: Path, file_type: str) -> str: #Tuple[str, Tuple]:
+    @staticmethod
+    def fingerprint(type_fast_path: str = 'magic', sketch_top_k: int = 0) -> str:
+        """Identify the analyzer logic and the active pattern sets, used to key cached results"""
+        parts = [CodeAnalyzer.ANALYZER_VERSION]
+        for patterns in CodeAnalyzer.PATTERN_GROUPS.values():
+            parts.extend(f"{p.pattern}/{p.flags}" for p in patterns)
+        parts.append(f"max_matches/{CodeAnalyzer.MAX_MATCHES}")
+        parts.extend(sorted(FileTypeDetector.VALID_TYPES))
+        # The file type fast path agrees with the model on signatures, the file names can change some labels
+        parts.extend(f"{magic.hex()}/{label}" for magic, label in FileTypeDetector.FAST_PATH_MAGIC.items())
+        parts.append(str(FileTypeDetector.FAST_PATH_MIN_SIZE))
+        if type_fast_path == 'all':
+            parts.extend(f"{name}/{label}" for name, label in sorted(FileTypeDetector.FAST_PATH_NAMES.items()))
+        if sketch_top_k:
+            # Summarized while scanned (per file top k by Space-Saving)
+            parts.append(f"sketch/{sketch_top_k}/{MatchSketch.PRECISION}/streamed")
+        return hashlib.sha256("\n".join(parts).encode("utf8")).hexdigest()[:16]
+
+    def _preprocess_content(self, content: Union[str, bytes], file_name: str, file_type: str, parsed: Optional[ParsedFile] = None) -> Tuple[Union[str, bytes], Tuple]:
         """Preprocess content: extract metrics and remove comments"""
         # Get pre-metrics for JS-like files
         if FileTypeDetector.is_js_like_file(file_type):
-            #pre_metrics = self.generic_analyzer.pre_analyze_js(content)
-            content, num_comments = UtilsForAnalyzer.remove_comments(content, file_path.name)
-
-            #num_chars, num_lines, entropy, ws_ratio, num_ws, num_printable = pre_metrics
-            return content 
-            """, (
-                num_chars,
-                num_lines,
-                num_comments,
-                entropy,
-                ws_ratio,
-                num_ws,
-                num_printable,
-            )"""
+            pre_metrics = self.generic_analyzer.pre_analyze_js(content)
+            content, num_comments = UtilsForAnalyzer.remove_comments(content, file_name, parsed)
+            # Without comments the content is the same, its metrics are not computed again
+            return content, (num_comments, pre_metrics if num_comments else None)
         
         # For non-JS files, i don't remove comments, i analyze this later
-        return content #, (0, 0, 0, 0.0, 0, 0, 0)
\ No newline at end of file
+        return content, (0, None)
@@ -0,0 +1,67 @@
+from collections import OrderedDict
+from dataclasses import replace
+from pathlib import PurePath
+from typing import Callable, Dict, Optional, Tuple
+from models.composed_metrics import FileMetrics
+from utils import MetricsStore
+from .code_analyzer import CodeAnalyzer
+
+class FileMetricsCache:
+    """In-memory LRU cache of per-file results, keyed by content hash and analyzer fingerprint.
+    Consecutive versions of a package share most of their files, so identical content is analyzed only once.
+    If a persistent store is given, it is used as second level to reuse results of previous runs."""
+
+    def __init__(self, max_entries: int = 50000, store: Optional[MetricsStore] = None, fingerprint: Optional[str] = None,
+                 compact: Optional[Callable[[FileMetrics], FileMetrics]] = None):
+        self.max_entries = max_entries
+        self.store = store
+        # Applied to the results loaded from the store before they are cached, results given to put are already compact
+        self.compact = compact
+        self.fingerprint = fingerprint or CodeAnalyzer.fingerprint()
+        self._entries: "OrderedDict[Tuple[str, str, str], FileMetrics]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _name(package_info: Dict) -> str:
+        # The file name is part of the key because comment removal treats index.d.ts differently
+        return PurePath(package_info['file_name']).name.lower()
+
+    def _key(self, digest: str, package_info: Dict) -> Tuple[str, str, str]:
+        return (self.fingerprint, digest, self._name(package_info))
+
+    def get(self, digest: str, package_info: Dict) -> Optional[FileMetrics]:
+        """Return a clone of the cached metrics with package, version and file_path rewritten"""
+        key = self._key(digest, package_info)
+        cached = self._entries.get(key)
+        if cached is None and self.store is not None:
+            cached = self.store.get_file(digest, self._name(package_info))
+            if cached is not None:
+                if self.compact is not None:
+                    cached = self.compact(cached)
+                self._remember(key, cached)
+        if cached is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        # Nested metrics are shared with the cached entry: they are compacted before being cached, never modified after
+        return replace(
+            cached,
+            package=package_info['name'],
+            version=package_info['version'],
+            file_path=package_info['file_name'],
+        )
+
+    def put(self, digest: str, package_info: Dict, metrics: FileMetrics) -> None:
+        if metrics is None:
+            return
+        self._remember(self._key(digest, package_info), metrics)
+        if self.store is not None:
+            self.store.put_file(digest, self._name(package_info), metrics)
+
+    def _remember(self, key: Tuple[str, str, str], metrics: FileMetrics) -> None:
+        self._entries[key] = metrics
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
@@ -15,27 +15,31 @@ class LocalVersionAnalyzer:
         self.local_extract_dir = self.local_versions_dir / "extracted"
         self._local_versions = {}
         
-    def setup_local_versions(self) -> None:
-        """Sets up local versions for analysis"""
+    def setup_local_versions(self, extract: bool = True) -> None:
+        """Sets up local versions for analysis (extract=False keeps the .tgz, to be analyzed in memory)"""
         local_versions = self._get_local_versions_for_package()
         if not local_versions:
             synchronized_print(f"No local versions found for {self.pkg_name}")
             return
 
         synchronized_print(f"Found {len(local_versions)} local versions for {self.pkg_name}")
-        self.local_extract_dir.mkdir(parents=True, exist_ok=True)
+        if extract:
+            self.local_extract_dir.mkdir(parents=True, exist_ok=True)
 
         for local_version in local_versions:
             try:
-                extracted_path = self._extract_local_version(
-                    local_version,
-                    self.local_extract_dir
-                )
+                if extract:
+                    extracted_path = self._extract_local_version(
+                        local_version,
+                        self.local_extract_dir
+                    )
+                else:
+                    extracted_path = local_version['path']
                 version_with_suffix = f"{local_version['version']}"
                 # test
                 #version_with_suffix = f"{local_version['version']}+local"
                 #version_with_suffix = f"v{local_version['version']}-local"
-                self._local_versions[version_with_suffix] = extracted_path
+                self._local_versions[version_with_suffix] = (extracted_path, local_version['path'])
                 #synchronized_print(f"Added local version {version_with_suffix}")
             except Exception as e:
                 synchronized_print(f"Error extracting {local_version['filename']}: {e}")
@@ -137,18 +141,18 @@ class LocalVersionAnalyzer:
     def unite_versions(self, entries: List[VersionEntry]) -> List[VersionEntry]:
         """Combines tarball and local versions into a single sorted list of VersionEntry"""
         if self._local_versions:
-            for l_name, l_path in self._local_versions.items():
+            for l_name, (l_path, l_tarball) in self._local_versions.items():
                 inserted = False
                 for i, entry in enumerate(entries):
                     # If the version in the entry is newer than the local version
                     if self.compare_versions(entry.name, l_name) > 0:
-                        entries.insert(i, VersionEntry(name=l_name, source=SourceType.LOCAL, ref=l_path))
+                        entries.insert(i, VersionEntry(name=l_name, source=SourceType.LOCAL, ref=l_path, tarball=l_tarball))
                         inserted = True
                         break
                 
                 # It is the most recent version, I add it at the end
                 if not inserted:
-                    entries.append(VersionEntry(name=l_name, source=SourceType.LOCAL, ref=l_path))
+                    entries.append(VersionEntry(name=l_name, source=SourceType.LOCAL, ref=l_path, tarball=l_tarball))
 
         return entries
         # OLD 
@@ -1,10 +1,85 @@
-from typing import List
+import copy
+import math
+from collections import Counter
+from fractions import Fraction
+from typing import Dict, Iterable, List, Optional
+from models import MatchSketch
 from models.composed_metrics import FileMetrics, VersionMetrics
 from utils import synchronized_print
 #from models import CodeType
 
+class VersionAccumulator:
+    """Version metrics of a set of files that is updated one file at a time, e.g. from a version to the next one.
+    Every metric can be taken back: sums, and multisets for the lists and the longest line. The weighted sums are
+    exact fractions, so the result does not depend on the order in which files were added and removed.
+    Match lists summarized by sketches (--sketch-matches) are merged into sketches instead, which cannot be taken back"""
+
+    def __init__(self):
+        self.metrics = VersionMetrics()             # Sums, the lists are filled from the multisets in result()
+        self.file_types: Counter = Counter()
+        self.longest_lines: Counter = Counter()
+        self.obfuscation_patterns: Counter = Counter()
+        self.crypto_addresses: Counter = Counter()
+        self.sketches: Dict[str, MatchSketch] = {}  # Sketched lists: name -> merged sketch
+        self.weighted_sums: Dict[str, Fraction] = {name: Fraction(0) for name in MetricsAggregator.WEIGHTED_AVERAGES}
+
+    def add(self, fm: FileMetrics) -> None:
+        MetricsAggregator._aggregate_file_metrics(self, fm, 1)
+
+    def remove(self, fm: FileMetrics) -> None:
+        MetricsAggregator._aggregate_file_metrics(self, fm, -1)
+
+    @staticmethod
+    def count(counter: Counter, values: Iterable, sign: int) -> None:
+        for value in values:
+            counter[value] += sign
+            if not counter[value]:
+                del counter[value]
+
+    def merge(self, name: str, sketch: MatchSketch, sign: int) -> None:
+        if sign < 0:
+            raise ValueError(f"Files with sketched matches ({name}) cannot be removed from the version")
+        if name not in self.sketches:
+            self.sketches[name] = MatchSketch(sketch.k)
+        self.sketches[name].merge(sketch)
+
+    def count_matches(self, name: str, values: List[str], sketch: Optional[MatchSketch], sign: int) -> None:
+        """Matches of a file, counted exactly or merged into the sketch of the version"""
+        if sketch is not None:
+            self.merge(name, sketch, sign)
+        else:
+            self.count(getattr(self, name), values, sign)
+
+    def result(self, package: str, version: str) -> VersionMetrics:
+        """Metrics of the files currently in the accumulator"""
+        vm = copy.deepcopy(self.metrics)
+        vm.package = package
+        vm.version = version
+        vm.generic.list_file_types = list(self.file_types)
+        vm.generic.longest_line_length_no_comments = max(self.longest_lines, default=0)
+        vm.evasion.list_obfuscation_patterns = list(self.obfuscation_patterns)
+        vm.crypto.list_crypto_addresses = list(self.crypto_addresses)
+        MetricsAggregator._finalize_metrics(vm)
+        MetricsAggregator._finalize_weighted_averages(vm, self.weighted_sums)
+        # Sketched lists hold the most frequent matches, with an estimated unique count past their size
+        if 'obfuscation_patterns' in self.sketches:
+            vm.evasion.list_obfuscation_patterns = self.sketches['obfuscation_patterns'].top()
+            vm.evasion.len_list_obfuscation_patterns_unique = self.sketches['obfuscation_patterns'].unique()
+        if 'crypto_addresses' in self.sketches:
+            vm.crypto.list_crypto_addresses = self.sketches['crypto_addresses'].top()
+            vm.crypto.len_list_crypto_addresses_unique = self.sketches['crypto_addresses'].unique()
+        return vm
+
 class MetricsAggregator:
     """Aggregates file-level metrics into version-level metrics"""
+
+    # Weighted averages of the version: name -> (file metric, characters of the file used as weight)
+    WEIGHTED_AVERAGES = {
+        'weighted_avg_shannon_entropy_original': ('shannon_entropy_original', 'number_of_characters'),
+        'weighted_avg_shannon_entropy_no_comments': ('shannon_entropy_no_comments', 'number_of_characters_no_comments'),
+        'weighted_avg_blank_space_and_character_ratio_original': ('blank_space_and_character_ratio_original', 'number_of_characters'),
+        'weighted_avg_blank_space_and_character_ratio_no_comments': ('blank_space_and_character_ratio_no_comments', 'number_of_characters_no_comments'),
+    }
     
     @staticmethod
     def aggregate_version_metrics(metrics_list: List[FileMetrics]) -> VersionMetrics:
@@ -13,25 +88,23 @@ class MetricsAggregator:
             synchronized_print("Warning: blank metrics list provided to aggregate")
             return None
         
-        version_metrics = VersionMetrics()
-        version_metrics.package = metrics_list[0].package
-        version_metrics.version = metrics_list[0].version
-        
         # Calculate character totals for weighted averages
         #totals = MetricsAggregator._calculate_character_totals(metrics_list)
         
-        # Aggregate all metrics
+        # Aggregate all metrics, post-processing (remove duplicates and compute unique counts) is done by the accumulator
+        accumulator = VersionAccumulator()
         for fm in metrics_list:
-            MetricsAggregator._aggregate_generic_metrics(version_metrics, fm) #, totals)
-            MetricsAggregator._aggregate_evasion_metrics(version_metrics, fm)
-            #MetricsAggregator._aggregate_payload_metrics(version_metrics, fm)
-            #MetricsAggregator._aggregate_exfiltration_metrics(version_metrics, fm)
-            MetricsAggregator._aggregate_crypto_metrics(version_metrics, fm)
-        
-        # Post-processing: remove duplicates and compute unique counts
-        MetricsAggregator._finalize_metrics(version_metrics)
-        
-        return version_metrics
+            accumulator.add(fm)
+        return accumulator.result(metrics_list[0].package, metrics_list[0].version)
+
+    @staticmethod
+    def _aggregate_file_metrics(acc: VersionAccumulator, fm: FileMetrics, sign: int):
+        """Add (sign 1) or remove (sign -1) the metrics of a file"""
+        MetricsAggregator._aggregate_generic_metrics(acc, fm, sign) #, totals)
+        MetricsAggregator._aggregate_evasion_metrics(acc, fm, sign)
+        #MetricsAggregator._aggregate_payload_metrics(version_metrics, fm)
+        #MetricsAggregator._aggregate_exfiltration_metrics(version_metrics, fm)
+        MetricsAggregator._aggregate_crypto_metrics(acc, fm, sign)
     #TEST
     """
     @staticmethod
@@ -96,38 +169,51 @@ class MetricsAggregator:
         """
     
     @staticmethod
-    def _aggregate_generic_metrics(vm: VersionMetrics, fm: FileMetrics): #, totals: dict):
+    def _aggregate_generic_metrics(acc: VersionAccumulator, fm: FileMetrics, sign: int): #, totals: dict):
         """Aggregate generic metrics including weighted averages"""
+        vm = acc.metrics
         
         # === Basic Counts ===
-        vm.generic.total_files += 1
-        vm.generic.list_file_types.append(fm.generic.file_type)
-        vm.generic.total_dim_bytes_pkg += fm.generic.size_bytes
-        """
-        vm.generic.total_number_of_characters += fm.generic.number_of_characters
-        vm.generic.total_number_of_characters_no_comments += fm.generic.number_of_characters_no_comments
-        """
+        vm.generic.total_files += sign
+        acc.count(acc.file_types, [fm.generic.file_type], sign)
+        vm.generic.total_dim_bytes_pkg += sign * fm.generic.size_bytes
+        vm.generic.total_number_of_characters += sign * fm.generic.number_of_characters
+        vm.generic.total_number_of_characters_no_comments += sign * fm.generic.number_of_characters_no_comments
+        
         # Plain text vs other files
         if fm.generic.is_plain_text_file:
-            vm.generic.total_plain_text_files += 1
+            vm.generic.total_plain_text_files += sign
             """
             vm.generic.total_dim_plain_text_files += fm.generic.size_bytes
             vm.generic.list_plain_text_files.append(fm.file_path)
             """
         else:
-            vm.generic.total_other_files += 1
+            vm.generic.total_other_files += sign
             """
             vm.generic.total_dim_bytes_other_files += fm.generic.size_bytes
             vm.generic.list_other_files.append(fm.file_path)
             """
-        """
         # Line counts
-        vm.generic.total_number_of_non_blank_lines += fm.generic.total_number_of_non_blank_lines
-        vm.generic.total_number_of_comments += fm.generic.number_of_comments
-        vm.generic.total_number_of_non_blank_lines_no_comments += fm.generic.number_of_non_blank_lines_no_comments
-        """
+        vm.generic.total_number_of_non_blank_lines += sign * fm.generic.total_number_of_non_blank_lines
+        vm.generic.total_number_of_comments += sign * fm.generic.number_of_comments
+        vm.generic.total_number_of_non_blank_lines_no_comments += sign * fm.generic.number_of_non_blank_lines_no_comments
+        
         # Longest line
-        vm.generic.longest_line_length_no_comments = max(vm.generic.longest_line_length_no_comments, fm.generic.longest_line_length_no_comments)
+        acc.count(acc.longest_lines, [fm.generic.longest_line_length_no_comments], sign)
+
+        # Character counts (printable + whitespace)
+        vm.generic.total_number_of_printable_characters += sign * fm.generic.number_of_printable_characters
+        vm.generic.total_number_of_printable_characters_no_comments += sign * fm.generic.number_of_printable_characters_no_comments
+        vm.generic.total_number_of_whitespace_characters += sign * fm.generic.number_of_whitespace_characters
+        vm.generic.total_number_of_whitespace_characters_no_comments += sign * fm.generic.number_of_whitespace_characters_no_comments
+
+        # === Weighted Averages ===
+        # Summed here weighted by the characters of the file, divided by the total characters in _finalize_weighted_averages,
+        # so the files are visited once. Files without printable characters have no ratio, they are left out of it
+        for name, (metric, weight) in MetricsAggregator.WEIGHTED_AVERAGES.items():
+            value = getattr(fm.generic, metric)
+            if math.isfinite(value):
+                acc.weighted_sums[name] += sign * Fraction(value) * getattr(fm.generic, weight)
         """    
         if fm.generic.code_type == CodeType.MINIFIED:
             vm.generic.longest_line_length_no_comments_only_minified = max(
@@ -203,10 +289,11 @@ class MetricsAggregator:
             vm.generic.weighted_avg_blank_space_and_character_ratio_no_comments_no_minified += fm.generic.blank_space_and_character_ratio_no_comments * weight
     """
     @staticmethod
-    def _aggregate_evasion_metrics(vm: VersionMetrics, fm: FileMetrics):
+    def _aggregate_evasion_metrics(acc: VersionAccumulator, fm: FileMetrics, sign: int):
         """Aggregate evasion metrics"""
-        vm.evasion.obfuscation_patterns_count += fm.evasion.obfuscation_patterns_count
-        vm.evasion.list_obfuscation_patterns.extend(fm.evasion.list_obfuscation_patterns)
+        vm = acc.metrics
+        vm.evasion.obfuscation_patterns_count += sign * fm.evasion.obfuscation_patterns_count
+        acc.count_matches('obfuscation_patterns', fm.evasion.list_obfuscation_patterns, fm.evasion.obfuscation_patterns_sketch, sign)
         #if fm.evasion.possible_obfuscated:
         #    vm.evasion.list_possible_presence_of_obfuscated_files.extend([fm.file_path])
         #vm.evasion.platform_detections_count += fm.evasion.platform_detections_count
@@ -234,10 +321,11 @@ class MetricsAggregator:
         vm.exfiltration.list_data_transmissions.extend(fm.exfiltration.list_data_transmissions)
     """
     @staticmethod
-    def _aggregate_crypto_metrics(vm: VersionMetrics, fm: FileMetrics):
+    def _aggregate_crypto_metrics(acc: VersionAccumulator, fm: FileMetrics, sign: int):
         #Aggregate crypto metrics
-        vm.crypto.crypto_addresses += fm.crypto.crypto_addresses
-        vm.crypto.list_crypto_addresses.extend(fm.crypto.list_crypto_addresses)
+        vm = acc.metrics
+        vm.crypto.crypto_addresses += sign * fm.crypto.crypto_addresses
+        acc.count_matches('crypto_addresses', fm.crypto.list_crypto_addresses, fm.crypto.crypto_addresses_sketch, sign)
         #vm.crypto.cryptocurrency_name += fm.crypto.cryptocurrency_name
         #vm.crypto.list_cryptocurrency_names.extend(fm.crypto.list_cryptocurrency_names)
         #vm.crypto.wallet_detection += fm.crypto.wallet_detection
@@ -286,4 +374,15 @@ class MetricsAggregator:
         vm.crypto.len_list_crypto_addresses_unique = len(vm.crypto.list_crypto_addresses)
         """
         vm.crypto.len_list_cryptocurrency_names_unique = len(vm.crypto.list_cryptocurrency_names)
-        """
\ No newline at end of file
+        """
+
+    @staticmethod
+    def _finalize_weighted_averages(vm: VersionMetrics, weighted_sums: Dict[str, Fraction]):
+        """Divide the weighted sums by the total characters. Without any comment in the version
+        the no_comments averages are left at 0, they would only repeat the original ones"""
+        for name, (_, weight) in MetricsAggregator.WEIGHTED_AVERAGES.items():
+            total = getattr(vm.generic, 'total_' + weight)
+            if total > 0 and (weight == 'number_of_characters' or vm.generic.total_number_of_comments > 0):
+                setattr(vm.generic, name, float(weighted_sums[name] / total))
+            else:
+                setattr(vm.generic, name, 0.0)
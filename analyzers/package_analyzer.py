@@ -1,38 +1,55 @@
 from pathlib import Path
-from utils import NPMClient
+from typing import Optional
+from models import AnalysisOptions
+from utils import NPMClient, TarballDownloader
 from .version_analyzer import VersionAnalyzer
 from analyzers.local_version_analyzer import LocalVersionAnalyzer
 from utils import synchronized_print
 
 class PackageAnalyzer:
     """Coordinator for analyzing Git and local versions of an npm package"""
-    def __init__(self, include_local: bool = False, local_versions_dir: str = "./local_versions", workers: int = 1, package_name: str = "", output_dir: Path = Path(".")):
+    def __init__(self, include_local: bool = False, local_versions_dir: str = "./local_versions", workers: int = 1, package_name: str = "", output_dir: Path = Path("."), options: Optional[AnalysisOptions] = None):
         self.pkg_name = package_name
         self.output_dir = output_dir
-        self.npm_client = NPMClient(pkg_name=package_name)
         self.include_local = include_local
         self.local_versions_dir = local_versions_dir
+        self.options = options or AnalysisOptions()
+        downloader = TarballDownloader(
+            max_workers=self.options.download_workers,
+            per_host=self.options.download_per_host,
+            timeout=self.options.download_timeout,
+            chunk_size=self.options.download_chunk_kb * 1024,
+        )
+        self.npm_client = NPMClient(
+            registry_url=self.options.registry_url,
+            pkg_name=package_name,
+            downloader=downloader,
+            metadata_cache_dir=self.options.metadata_cache_dir,
+            metadata_timeout=self.options.metadata_timeout,
+            abbreviated=not self.options.full_metadata,
+        )
         self.version_analyzer = VersionAnalyzer(
             max_processes=workers,
             include_local=include_local,
             local_versions_dir=local_versions_dir,
             package_name=package_name,
-            output_dir=output_dir
+            output_dir=output_dir,
+            options=options
         )
         
-    def analyze_package(self) -> None:
-        """Analyze all versions of a package"""
-        entries = self.npm_client.download_package_versions_tarball()
+    def analyze_package(self) -> bool:
+        """Analyze all versions of a package, False if some could not be analyzed"""
+        entries = self.npm_client.download_package_versions_tarball(extract=not self.options.stream)
         if not entries:
             synchronized_print(f"Unable to analyze {self.pkg_name} - No versions available or too few")
-            return
+            return False
         if self.include_local:
             localversionanalyzer = LocalVersionAnalyzer(local_versions_dir=self.local_versions_dir, pkg_name=self.pkg_name)
-            localversionanalyzer.setup_local_versions()
+            localversionanalyzer.setup_local_versions(extract=not self.options.stream)
             entries = localversionanalyzer.unite_versions(entries)  #([])
         try:
             self.version_analyzer.entries = self.npm_client.order_versions(entries)
         except Exception as e:
             synchronized_print(f"Error ordering versions for {self.pkg_name}: {e}")
-            return
-        self.version_analyzer.analyze_versions()
\ No newline at end of file
+            return False
+        return self.version_analyzer.analyze_versions()
\ No newline at end of file
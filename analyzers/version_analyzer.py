@@ -1,25 +1,48 @@
 from pathlib import Path
-from typing import List
-import multiprocessing as mp
-from models.composed_metrics import FileMetrics
-from reporters import CSVReporter
-from utils import FileHandler, synchronized_print
+from dataclasses import replace
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+from models.composed_metrics import FileMetrics, VersionDiff, VersionMetrics
+from reporters import CSVWriter, ParquetReporter, ParquetWriter
+from utils import FileHandler, FileTypeDetector, MetricsStore, ProgressManifest, StringTable, synchronized_print
 from .code_analyzer import CodeAnalyzer
-from .metrics_aggregator import MetricsAggregator
-from models import SourceType, VersionEntry
+from .file_metrics_cache import FileMetricsCache
+from .metrics_aggregator import MetricsAggregator, VersionAccumulator
+from .worker_pool import WorkerPool
+from models import AnalysisOptions, SourceType, VersionEntry
 
 class VersionAnalyzer:
     """Handles analysis of versions from tarballs and local versions"""    
+
+    # Most files per worker task, their types are detected together before they are analyzed
+    WORKER_BATCH_SIZE = 256
+    # File rows written together with --stream-results, also the size of the Parquet row groups
+    ROW_BATCH_SIZE = 1024
+
+    # Tables written for each version, as CSV files and/or Parquet directories in the output directory of the package
+    TABLES = ("file_metrics", "aggregate_metrics_by_single_version", "version_diff")
+    OUTPUT_FILES = tuple(f"{table}.csv" for table in TABLES)
+    PARQUET_DIR = "parquet"
+
     def __init__(self, max_processes: int = 1, include_local: bool = False, 
                  local_versions_dir: str = "./local_versions", package_name: str = "", 
-                 output_dir: Path = Path(".")):
+                 output_dir: Path = Path("."), options: Optional[AnalysisOptions] = None):
         self.package_name = package_name
         self.output_dir = output_dir
+        self.options = options or AnalysisOptions()
         self.code_analyzer = CodeAnalyzer()
+        self.store: Optional[MetricsStore] = None
+        self.metrics_cache = FileMetricsCache(fingerprint=CodeAnalyzer.fingerprint(self.options.type_fast_path, self.options.sketch_top_k),
+                                              compact=self._compact_nested)
         self.max_processes = max_processes
         self.include_local = include_local
         self.local_versions_dir = local_versions_dir
         self.entries: List[VersionEntry] = []
+        self.progress = ProgressManifest(self.options.progress_path) if self.options.progress_path else None
+        self.csv_writers: Dict[str, CSVWriter] = {}
+        # Strings repeated across the results of the package, see _compact
+        self.strings = StringTable()
+        # Diff mode: (version, manifest, file metrics by path, aggregate) of the previous version
+        self._previous: Optional[Tuple[str, Dict[str, Tuple[int, Optional[str]]], Dict[str, FileMetrics], VersionAccumulator]] = None
 
     def _find_package_root(self, extract_path: Path) -> Path:
         """Find the actual package root directory inside the extracted tarball"""
@@ -36,84 +59,407 @@ class VersionAnalyzer:
         
         raise FileNotFoundError(f"Could not find package.json in {extract_path} or subdirectories")
     
-    def analyze_versions(self) -> None:
-        """Analyze all versions"""
+    def analyze_versions(self) -> bool:
+        """Analyze all versions, False if the analysis stopped before the last one"""
         if not self.entries:
             synchronized_print(f"No versions to analyze for {self.package_name}")
-            return
+            return True
 
+        if self.options.store_path:
+            self.store = MetricsStore(self.options.store_path, self.metrics_cache.fingerprint, self.options.store_max_mb,
+                                      FileTypeDetector.fingerprint())
+            self.metrics_cache.store = self.store
+        self._previous = None
+        self.strings = StringTable()
+        if self.options.output_format in ("csv", "both"):
+            # Kept open for all the versions of the package
+            self.csv_writers = {table: CSVWriter(self.output_dir / f"{table}.csv") for table in self.TABLES}
+        try:
+            return self._analyze_entries()
+        finally:
+            for writer in self.csv_writers.values():
+                writer.close()
+            self.csv_writers = {}
+            self._previous = None
+            self.strings = StringTable()
+            if self.store is not None:
+                self.store.close()
+                self.store = None
+                self.metrics_cache.store = None
+
+    def _completed_versions(self) -> Dict[str, Dict[str, int]]:
+        """Versions finished by the run that is resumed, the output written after the last one is dropped"""
+        if self.progress is None or not self.options.resume:
+            return {}
+        # Read from the manifest once for all the packages, by main.py
+        completed = self.options.completed_versions
+        last_outputs = list(completed.values())[-1] if completed else {}
+        ProgressManifest.truncate_outputs(self.output_dir, last_outputs, self.OUTPUT_FILES)
+        for table in self.TABLES:
+            ParquetReporter.remove_versions(self.output_dir / self.PARQUET_DIR / table, completed)
+        return completed
+
+    def _analyze_entries(self) -> bool:
+        completed = self._completed_versions()
         for i, entry in enumerate(self.entries):
+            if entry.name in completed:
+                synchronized_print(f"  [{i+1}/{len(self.entries)}] Tag {entry.name} already analyzed")
+                if self.options.diff_versions and i + 1 < len(self.entries) and self.entries[i + 1].name not in completed:
+                    # The next version is compared to this one
+                    try:
+                        self._analyze_version_diff(entry)
+                    except Exception as e:
+                        synchronized_print(f"Error analyzing tag {entry.name}: {e}")
+                        return False
+                continue
             synchronized_print(f"  [{i+1}/{len(self.entries)}] Analyzing tag {entry.name}")
             try: 
-                repo_path = self._find_package_root(entry.ref)
-                
-                # Analyze all files in version
-                curr_metrics = self._analyze_version(entry.name, repo_path, entry.source)
-                synchronized_print(f"    {len(curr_metrics)} files analyzed.")
-                
-                # Aggregate metrics for the version
-                aggregate_metrics = MetricsAggregator.aggregate_version_metrics(curr_metrics)
+                tarball_digest = FileHandler.hash_file(entry.tarball) if self.store is not None and entry.tarball else None
+                # In diff mode the files are hashed anyway, unchanged ones are carried forward from the previous version
+                stored = self.store.get_version(tarball_digest) if tarball_digest and not self.options.diff_versions else None
+                diff = None
+                if stored is not None:
+                    curr_metrics, aggregate_metrics = self._rewrite_stored_version(stored, entry.name)
+                    synchronized_print(f"    {len(curr_metrics)} files loaded from metrics store.")
+                elif self.options.diff_versions:
+                    curr_metrics, aggregate_metrics, diff = self._analyze_version_diff(entry)
+                    synchronized_print(f"    {diff.added_files + diff.modified_files} files analyzed, {diff.unchanged_files} unchanged, {diff.removed_files} removed.")
+                    if tarball_digest and aggregate_metrics is not None:
+                        self.store.put_version(tarball_digest, curr_metrics, aggregate_metrics)
+                elif self.options.stream_results:
+                    # The file rows are written as they are analyzed, curr_metrics is not kept (nor stored)
+                    aggregate_metrics, file_count = self._analyze_version_results(entry)
+                    curr_metrics = None
+                    synchronized_print(f"    {file_count} files analyzed ({self.metrics_cache.hits} cache hits so far).")
+                else:
+                    # Analyze all files in version
+                    if self.options.stream and entry.tarball:
+                        curr_metrics = self._analyze_version_stream(entry.name, entry.tarball, entry.source)
+                    else:
+                        repo_path = self._find_package_root(entry.ref)
+                        curr_metrics = self._analyze_version(entry.name, repo_path, entry.source)
+                    synchronized_print(f"    {len(curr_metrics)} files analyzed ({self.metrics_cache.hits} cache hits so far).")
+                    
+                    # Aggregate metrics for the version
+                    aggregate_metrics = MetricsAggregator.aggregate_version_metrics(curr_metrics)
+
+                    if tarball_digest and aggregate_metrics is not None:
+                        self.store.put_version(tarball_digest, curr_metrics, aggregate_metrics)
+                if self.store is not None:
+                    self.store.commit()
 
                 # Save metrics incrementally
-                CSVReporter.save_csv(self.output_dir / "file_metrics.csv", curr_metrics)
-                CSVReporter.save_csv(self.output_dir / "aggregate_metrics_by_single_version.csv", aggregate_metrics)
+                self._save_reports(entry.name, (curr_metrics, aggregate_metrics, diff))
+                if self.progress is not None:
+                    self.progress.record_version(self.package_name, entry.name, self.output_dir, self.OUTPUT_FILES)
                 
             except FileNotFoundError as e:
                 synchronized_print(f"Skipping tag {entry.name}: {e}")
-                return
+                return False
             except Exception as e:
                 synchronized_print(f"Error analyzing tag {entry.name}: {e}")
-                return
+                return False
+        return True
+
+    def _save_reports(self, version: str, tables: Tuple) -> None:
+        """Rows of a version for each of TABLES, None for a table that is not written"""
+        for table, data in zip(self.TABLES, tables):
+            if data is None:
+                continue
+            if table in self.csv_writers:
+                self.csv_writers[table].write(data)
+            if self.options.output_format in ("parquet", "both"):
+                ParquetReporter.save_parquet(self.output_dir / self.PARQUET_DIR / table, version, data)
+        # The rows of the version are complete on disk before it is recorded as finished
+        for writer in self.csv_writers.values():
+            writer.flush()
+
+    def _analyze_version_results(self, entry: VersionEntry) -> Tuple[Optional[VersionMetrics], int]:
+        """Analyze all files of a version, each result is added to the aggregate and its row written as it arrives
+        (in completion order), in batches of ROW_BATCH_SIZE. Returns the aggregate and the number of files"""
+        if self.options.stream and entry.tarball:
+            items = self._version_stream_items(entry.name, entry.tarball, entry.source)
+        else:
+            items = self._version_items(entry.name, self._find_package_root(entry.ref), entry.source)
+
+        accumulator = VersionAccumulator()
+        csv_writer = self.csv_writers.get("file_metrics")
+        parquet_writer = None
+        if self.options.output_format in ("parquet", "both"):
+            parquet_writer = ParquetWriter(self.output_dir / self.PARQUET_DIR / "file_metrics", entry.name)
+        file_count = 0
+        rows = []
+        try:
+            for _, fm in self._iter_results(items, ordered=False):
+                accumulator.add(fm)
+                file_count += 1
+                rows.append(fm)
+                if len(rows) >= self.ROW_BATCH_SIZE:
+                    self._write_file_rows(rows, csv_writer, parquet_writer)
+                    rows = []
+            self._write_file_rows(rows, csv_writer, parquet_writer)
+        except Exception:
+            if parquet_writer is not None:
+                parquet_writer.abort()
+            raise
+        if parquet_writer is not None:
+            parquet_writer.close()
+
+        if not file_count:
+            synchronized_print("Warning: blank metrics list provided to aggregate")
+            return None, 0
+        return accumulator.result(self.package_name, entry.name), file_count
+
+    @staticmethod
+    def _write_file_rows(rows: List[FileMetrics], csv_writer: Optional[CSVWriter], parquet_writer: Optional[ParquetWriter]) -> None:
+        if not rows:
+            return
+        if csv_writer is not None:
+            csv_writer.write(rows)
+        if parquet_writer is not None:
+            parquet_writer.write(rows)
+
+    def _rewrite_stored_version(self, stored: Tuple[List[FileMetrics], VersionMetrics], version: str) -> Tuple[List[FileMetrics], VersionMetrics]:
+        """Results of a stored tarball, relabeled for this package and version"""
+        file_metrics, version_metrics = stored
+        file_metrics = [self._compact(self._compact_nested(replace(fm, package=self.package_name, version=version)))
+                        for fm in file_metrics]
+        return file_metrics, replace(version_metrics, package=self.package_name, version=version)
+
+    def _find_stream_package_root(self, names: List[str], tarball: Path) -> str:
+        """Same as _find_package_root, on the member names of a tarball that is not extracted"""
+        roots = []
+        for name in names:
+            top, _, rest = name.partition('/')
+            if rest == "package.json" and top not in roots:
+                roots.append(top)
+        if "package" in roots:
+            return "package"
+        if roots:
+            synchronized_print(f"    Found package root: {roots[0]}")
+            return roots[0]
+        raise FileNotFoundError(f"Could not find package.json in {tarball} or subdirectories")
+
+    def _analyze_version_diff(self, entry: VersionEntry) -> Tuple[List[FileMetrics], Optional[VersionMetrics], VersionDiff]:
+        """Analyze only the files added or modified since the previous version (same path, size and content hash),
+        the others are carried forward and the aggregate is updated with the changed files only"""
+        previous, self._previous = self._previous, None
+        previous_version, previous_manifest, previous_metrics, accumulator = previous or ("", {}, {}, VersionAccumulator())
+
+        if self.options.stream and entry.tarball:
+            items = self._version_stream_items(entry.name, entry.tarball, entry.source)
+        else:
+            items = self._version_items(entry.name, self._find_package_root(entry.ref), entry.source)
+        # Keyed by path: a path repeated in a tarball is extracted once, with the content of the last member
+        items_by_path = {item[1]['file_name']: item for item in items}
+        manifest = {path: (self._item_size(source), digest) for path, (source, _, digest) in items_by_path.items()}
+
+        diff = VersionDiff(package=self.package_name, version=entry.name, previous_version=previous_version)
+        for path, signature in manifest.items():
+            if path not in previous_manifest:
+                diff.added_files += 1
+            elif previous_manifest[path] != signature or signature[1] is None:
+                diff.modified_files += 1
+            else:
+                diff.unchanged_files += 1
+        removed = [path for path in previous_manifest if path not in manifest]
+        diff.removed_files = len(removed)
+
+        # Unchanged files without results (analysis failed) are analyzed again
+        changed = [path for path, signature in manifest.items()
+                   if path not in previous_metrics or previous_manifest.get(path) != signature or signature[1] is None]
+        for path in removed + changed:
+            if path in previous_metrics:
+                accumulator.remove(previous_metrics[path])
+        new_metrics = {fm.file_path: fm for fm in self._analyze_items([items_by_path[path] for path in changed])}
+        for fm in new_metrics.values():
+            accumulator.add(fm)
+
+        metrics_by_path = {}
+        for path in manifest:
+            if path in new_metrics:
+                metrics_by_path[path] = new_metrics[path]
+            elif path in previous_metrics and path not in changed:
+                metrics_by_path[path] = replace(previous_metrics[path], version=entry.name)
+        curr_metrics = list(metrics_by_path.values())
+
+        if not curr_metrics:
+            synchronized_print("Warning: blank metrics list provided to aggregate")
+        aggregate_metrics = accumulator.result(self.package_name, entry.name) if curr_metrics else None
+        self._previous = (entry.name, manifest, metrics_by_path, accumulator)
+        return curr_metrics, aggregate_metrics, diff
+
+    @staticmethod
+    def _item_size(source: Union[Path, bytes]) -> int:
+        if isinstance(source, (bytes, bytearray)):
+            return len(source)
+        try:
+            return source.stat().st_size
+        except OSError:
+            return -1
 
     def _analyze_version(self, version: str, package_dir: Path, source: SourceType) -> List[FileMetrics]:
         """Analyze all files of a specific version"""
-        files = FileHandler().get_all_files(package_dir)
-        
-        if self.max_processes > 1:
-            file_results = self._analyze_files_parallel(files, version, package_dir, source)
-        else:
-            file_results = self._analyze_files_sequential(files, version, package_dir, source)
-        
-        return [r for r in file_results if r is not None]
+        return self._analyze_items(self._version_items(version, package_dir, source))
 
-    def _analyze_files_sequential(self, files: List[Path], version: str, package_dir: Path, source: SourceType) -> List[FileMetrics]:
-        """Sequential analysis of files"""
-        results = []
+    def _version_items(self, version: str, package_dir: Path, source: SourceType) -> List[Tuple[Path, Dict, Optional[str]]]:
+        """(file path, package info, content hash) of all files of a version"""
+        files = FileHandler().get_all_files(package_dir)
+        items = []
         for file_path in files:
             try:
-                result = self._analyze_single_file(file_path, version, package_dir, source)
-                results.append(result)
-            except Exception as e:
-                print(f"Error analyzing {file_path}: {e}")
-                results.append(None)
-        return results
+                digest = FileHandler.hash_file(file_path)
+            except OSError:
+                digest = None
+            package_info = self._package_info(str(file_path.relative_to(package_dir)), version, str(package_dir), source)
+            items.append((file_path, package_info, digest))
+        return items
 
-    def _analyze_files_parallel(self, files: List[Path], version: str, package_dir: Path, source: SourceType) -> List[FileMetrics]:
-        """Parallel analysis of files"""
-        args_list = [(file_path, version, package_dir, source) for file_path in files]
-        
-        with mp.Pool(processes=self.max_processes) as pool:
-            results = pool.starmap(self._analyze_single_file_wrapper, args_list)
-        
-        return results
+    def _analyze_version_stream(self, version: str, tarball: Path, source: SourceType) -> List[FileMetrics]:
+        """Analyze all files of a specific version straight from the tarball, without touching the disk"""
+        return self._analyze_items(self._version_stream_items(version, tarball, source))
+
+    def _version_stream_items(self, version: str, tarball: Path, source: SourceType) -> List[Tuple[bytes, Dict, str]]:
+        """(content, package info, content hash) of all files of a version, read from the tarball"""
+        members = FileHandler.read_tarball_members(tarball)
+        root = self._find_stream_package_root([name for name, _ in members], tarball)
+        prefix = root + "/"
+        items = []
+        for name, data in members:
+            if not name.startswith(prefix):
+                continue
+            package_info = self._package_info(name[len(prefix):], version, f"{tarball}/{root}", source)
+            items.append((data, package_info, FileHandler.hash_bytes(data)))
+        return items
+
+    def _analyze_items(self, items: List[Tuple[Union[Path, bytes], Dict, Optional[str]]]) -> List[FileMetrics]:
+        """Analyze (file path or content, package info, content hash) items, reusing cached results for unchanged content"""
+        file_results: List[FileMetrics] = [None] * len(items)
+        for i, result in self._iter_results(items):
+            file_results[i] = result
+        return [r for r in file_results if r is not None]
+
+    def _iter_results(self, items: List[Tuple[Union[Path, bytes], Dict, Optional[str]]],
+                      ordered: bool = True) -> Iterator[Tuple[int, FileMetrics]]:
+        """(index, result) of the items that were analyzed: cached results first, then the others in the order of the
+        items, or as they are completed by the workers if not ordered. Files whose analysis failed are left out"""
+        pending = []    # (index, package_info, digest) of items not in cache
+        tasks = []
+
+        for i, (source, package_info, digest) in enumerate(items):
+            cached = self.metrics_cache.get(digest, package_info) if digest else None
+            if cached is not None:
+                yield i, self._compact(cached)
+            else:
+                pending.append((i, package_info, digest))
 
-    def _analyze_single_file_wrapper(self, file_path: Path, version: str, package_dir: Path, source: SourceType) -> FileMetrics:
-        """Wrapper function for parallel execution with error handling"""
+        # Types of contents identified before (e.g. with other patterns) are passed along, their detection is skipped
+        known_types = self._known_file_types(pending)
+        for (i, package_info, digest), file_type in zip(pending, known_types):
+            tasks.append((items[i][0], package_info, digest, file_type))
+
+        if self.max_processes > 1 and len(tasks) > 1:
+            new_results = enumerate(self._analyze_files_parallel(tasks)) if ordered else self._analyze_files_unordered(tasks)
+        else:
+            new_results = enumerate(self._analyze_files_sequential(tasks))
+
+        new_types = {}
+        for k, result in new_results:
+            i, package_info, digest = pending[k]
+            if result is not None:
+                # Before it is cached, the clones returned by the cache share its nested metrics
+                result = self._compact_nested(result)
+            if digest:
+                self.metrics_cache.put(digest, package_info, result)
+                if result is not None and known_types[k] is None and self._type_is_cacheable(package_info):
+                    FileTypeDetector.remember_type(digest, result.generic.file_type)
+                    new_types[digest] = result.generic.file_type
+            if result is not None:
+                yield i, self._compact(result)
+        if self.store is not None and new_types:
+            self.store.put_file_types(new_types)
+
+    def _compact(self, fm: FileMetrics) -> FileMetrics:
+        """Share the strings repeated across files, the results of all the files of a version are kept until it is
+        aggregated and saved. Results coming from workers or from the store have their own copy of every string"""
+        fm.package = self.strings.get(fm.package)
+        fm.version = self.strings.get(fm.version)
+        return fm
+
+    def _compact_nested(self, fm: FileMetrics) -> FileMetrics:
+        """Same as _compact for the nested metrics, done once for each result before it is cached"""
+        # Labels of a small fixed set (Magika labels or plain strings)
+        fm.generic.file_type = self.strings.get(fm.generic.file_type)
+        fm.evasion.list_obfuscation_patterns = self.strings.strings(fm.evasion.list_obfuscation_patterns)
+        fm.crypto.list_crypto_addresses = self.strings.strings(fm.crypto.list_crypto_addresses)
+        return fm
+
+    def _type_is_cacheable(self, package_info: Dict) -> bool:
+        return FileTypeDetector.is_cacheable(package_info['file_name'], self.options.type_fast_path)
+
+    def _known_file_types(self, pending: List[Tuple[int, Dict, Optional[str]]]) -> List[Optional[str]]:
+        """Type of each pending item already identified by content hash, in memory or in the store, None if unknown"""
+        known = []
+        missing = []    # (position, digest) of the types to look up in the store
+        for _, package_info, digest in pending:
+            file_type = None
+            if digest and self._type_is_cacheable(package_info):
+                file_type = FileTypeDetector.cached_type(digest)
+                if file_type is None:
+                    missing.append((len(known), digest))
+            known.append(file_type)
+        if self.store is not None and missing:
+            stored = self.store.get_file_types(digest for _, digest in missing)
+            for k, digest in missing:
+                if digest in stored:
+                    known[k] = stored[digest]
+                    FileTypeDetector.remember_type(digest, known[k])
+        return known
+
+    def _analyze_files_sequential(self, tasks: List[Tuple[Union[Path, bytes], Dict, Optional[str], Optional[str]]]) -> Iterator[Optional[FileMetrics]]:
+        """Sequential analysis of files, each result is returned as soon as it is ready"""
         try:
-            return self._analyze_single_file(file_path, version, package_dir, source)
+            file_types = self.code_analyzer.detect_file_types(tasks, self.options.type_fast_path, self.options.type_batch_size)
         except Exception as e:
-            rel_path = file_path.relative_to(package_dir) if package_dir in file_path.parents else file_path
-            print(f"Error analyzing {rel_path}: {type(e).__name__}: {e}")
-            return None
-
-    def _analyze_single_file(self, file_path: Path, version: str, package_dir: Path, source: SourceType) -> FileMetrics:
-        """Analyze a single file"""
-        rel_path = str(file_path.relative_to(package_dir))
-        package_info = {
+            print(f"Error detecting file types: {e}")
+            file_types = [file_type for _, _, _, file_type in tasks]
+        for (source, package_info, _, _), file_type in zip(tasks, file_types):
+            try:
+                result = self.code_analyzer.analyze(source, package_info, file_type, self.options.sketch_top_k)
+            except Exception as e:
+                print(f"Error analyzing {package_info['file_name']}: {e}")
+                result = None
+            yield result
+
+    def _analyze_files_parallel(self, tasks: List[Tuple[Union[Path, bytes], Dict, Optional[str], Optional[str]]]) -> List[FileMetrics]:
+        """Parallel analysis of files on the shared worker pool, in batches whose file types are detected together"""
+        pool = WorkerPool.get(self.max_processes)
+        results = pool.starmap(WorkerPool.analyze_batch, self._worker_batches(tasks), chunksize=1)
+        return [result for batch_results in results for result in batch_results]
+
+    def _analyze_files_unordered(self, tasks: List[Tuple[Union[Path, bytes], Dict, Optional[str], Optional[str]]]) -> Iterator[Tuple[int, Optional[FileMetrics]]]:
+        """Same as _analyze_files_parallel, but the (task index, result) of each batch are returned as soon as the batch
+        is done, so the results of the other batches are not waited for nor kept"""
+        pool = WorkerPool.get(self.max_processes)
+        args = self._worker_batches(tasks)
+        starts = [0]
+        for batch_args in args:
+            starts.append(starts[-1] + len(batch_args[0]))
+        for number, batch_results in pool.imap_unordered(WorkerPool.analyze_numbered_batch, enumerate(args)):
+            yield from enumerate(batch_results, starts[number])
+
+    def _worker_batches(self, tasks: List[Tuple[Union[Path, bytes], Dict, Optional[str], Optional[str]]]) -> List[Tuple]:
+        """Arguments of WorkerPool.analyze_batch for each batch of tasks"""
+        # Same split as the default chunksize of Pool.starmap, bounded so a batch does not hold too many contents
+        batch_size = max(1, min(self.WORKER_BATCH_SIZE, -(-len(tasks) // (self.max_processes * 4))))
+        batches = [tasks[i:i + batch_size] for i in range(0, len(tasks), batch_size)]
+        return [(batch, self.options.type_fast_path, self.options.type_batch_size, self.options.sketch_top_k) for batch in batches]
+
+    def _package_info(self, rel_path: str, version: str, package_dir: str, source: SourceType) -> Dict:
+        return {
             'name': self.package_name,
             'version': version,
-            'git_repo_path': str(package_dir),
+            'git_repo_path': package_dir,
             'file_name': rel_path,
             'info': source
         }
-        return self.code_analyzer.analyze_file(file_path, package_info)
\ No newline at end of file
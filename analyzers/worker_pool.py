@@ -0,0 +1,72 @@
+import multiprocessing as mp
+from multiprocessing.pool import Pool
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+from models.composed_metrics import FileMetrics
+from utils import FileTypeDetector, ParsedFile
+from .code_analyzer import CodeAnalyzer
+
+class WorkerPool:
+    """Long-lived pool of analysis workers, shared by every version and package of the run (singleton pattern)"""
+
+    _pool: Optional[Pool] = None
+    _processes: int = 0
+
+    # Per worker process, created once by the initializer
+    _code_analyzer: Optional[CodeAnalyzer] = None
+
+    @classmethod
+    def get(cls, processes: int) -> Pool:
+        """Lazy initialization of the pool, recreated only if a different size is requested"""
+        if cls._pool is not None and cls._processes != processes:
+            cls.close()
+        if cls._pool is None:
+            cls._pool = mp.Pool(processes=processes, initializer=WorkerPool._init_worker)
+            cls._processes = processes
+        return cls._pool
+
+    @classmethod
+    def close(cls) -> None:
+        """Shut down the pool at the end of the run"""
+        if cls._pool is not None:
+            cls._pool.close()
+            cls._pool.join()
+            cls._pool = None
+            cls._processes = 0
+
+    @staticmethod
+    def _init_worker() -> None:
+        """Load Magika, the tree-sitter parser and the compiled patterns once per worker"""
+        FileTypeDetector.get_magika()
+        ParsedFile.get_parser()
+        WorkerPool._code_analyzer = CodeAnalyzer()
+
+    @staticmethod
+    def analyze(source: Union[Path, bytes], package_info: Dict, file_type: Optional[str] = None, sketch_top_k: int = 0) -> Optional[FileMetrics]:
+        """Task executed in the workers (file path or in-memory content), with error handling"""
+        if WorkerPool._code_analyzer is None:
+            WorkerPool._init_worker()
+        try:
+            return WorkerPool._code_analyzer.analyze(source, package_info, file_type, sketch_top_k)
+        except Exception as e:
+            print(f"Error analyzing {package_info['file_name']}: {type(e).__name__}: {e}")
+            return None
+
+    @staticmethod
+    def analyze_batch(tasks: List[Tuple[Union[Path, bytes], Dict, Optional[str], Optional[str]]],
+                      fast_path: str = 'magic', type_batch_size: int = 1, sketch_top_k: int = 0) -> List[Optional[FileMetrics]]:
+        """Task executed in the workers on a batch of (source, package info, content hash, known type) files:
+        the unknown types are detected for the whole batch first"""
+        try:
+            file_types = CodeAnalyzer.detect_file_types(tasks, fast_path, type_batch_size)
+        except Exception as e:
+            print(f"Error detecting file types of a batch of {len(tasks)} files: {type(e).__name__}: {e}")
+            file_types = [file_type for _, _, _, file_type in tasks]
+        return [WorkerPool.analyze(source, package_info, file_type, sketch_top_k) for (source, package_info, _, _), file_type in zip(tasks, file_types)]
+
+    @staticmethod
+    def analyze_numbered_batch(numbered_args: Tuple[int, Tuple]) -> Tuple[int, List[Optional[FileMetrics]]]:
+        """analyze_batch for Pool.imap_unordered, which passes a single argument: the number of the batch is returned
+        with its results, the batches complete in any order"""
+        number, args = numbered_args
+        return number, WorkerPool.analyze_batch(*args)
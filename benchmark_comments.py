@@ -0,0 +1,99 @@
+"""
+benchmark_comments.py - compare the comment collection and deletion strategies of UtilsForAnalyzer.remove_comments.
+
+  - walk   : Python cursor walk over every node of the syntax tree (previous implementation)
+  - query  : precompiled tree-sitter query, the query cursor still visits every node on the C side
+  - lookup : byte search for the comment openers, each candidate confirmed with a lookup in the tree (current)
+
+All are run on the same parsed tree and must return the same ranges. The comments are then deleted:
+
+  - in place : one bytearray deletion per comment, from right to left (previous implementation)
+  - forward  : kept slices joined in a single forward pass, with the offset map (current)
+
+Without arguments a minified bundle and a heavily commented file are generated, otherwise the given JS/TS
+files are used.
+
+Usage:
+  python benchmark_comments.py [file ...] [--repeat N]
+"""
+import argparse
+import random
+import time
+from pathlib import Path
+from tree_sitter import Query, QueryCursor
+from utils import ParsedFile, UtilsForAnalyzer
+
+
+def generated_files():
+    """Synthetic inputs: a minified bundle (millions of nodes) and a file with a comment on every other line"""
+    random.seed(0)
+    statements = []
+    for i in range(120000):
+        statements.append(f"var _0x{i:04x}=function(a,b){{return a[{i % 97}]+b*{i}}}/*{i}*/;")
+    minified = "".join(statements)
+
+    lines = []
+    for i in range(60000):
+        lines.append(f"  // comment {i} " + "x" * random.randint(0, 40))
+        lines.append(f"  const value{i} = compute({i}, /* inline */ {i * 2});")
+    commented = "\n".join(lines) + "\n"
+    return [("generated-minified.js", minified), ("generated-commented.js", commented)]
+
+
+def query_comment_ranges(query, tree, content_bytes, is_index_d_ts):
+    captures = QueryCursor(query).captures(tree.root_node)
+    comment_ranges = sorted({(node.start_byte, node.end_byte) for nodes in captures.values() for node in nodes})
+    if is_index_d_ts:
+        comment_ranges = [(start, end) for start, end in comment_ranges if content_bytes[start:start + 3] != b"///"]
+    return comment_ranges
+
+
+def timed(function, repeat):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark comment collection on large files")
+    parser.add_argument("files", nargs="*", help="JS/TS files to use instead of the generated ones")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per strategy, the best one is reported")
+    args = parser.parse_args()
+
+    language = UtilsForAnalyzer.JS_LANGUAGE
+    kinds = {language.node_kind_for_id(i) for i in range(language.node_kind_count) if language.node_kind_is_named(i)}
+    query = Query(language, " ".join(f"({kind}) @comment" for kind in sorted(kinds) if "comment" in kind))
+
+    inputs = [(Path(f).name, Path(f).read_text(encoding="utf8", errors="replace")) for f in args.files] or generated_files()
+    for name, content in inputs:
+        parsed = ParsedFile(content, name)
+        parse_time, tree = timed(lambda: parsed.tree, 1)
+        is_index_d_ts = name.lower() == "index.d.ts"
+
+        walk_time, walk_ranges = timed(
+            lambda: UtilsForAnalyzer._collect_comment_ranges_walk(tree, parsed.content_bytes, is_index_d_ts), args.repeat)
+        query_time, query_ranges = timed(
+            lambda: query_comment_ranges(query, tree, parsed.content_bytes, is_index_d_ts), args.repeat)
+        lookup_time, lookup_ranges = timed(
+            lambda: UtilsForAnalyzer._collect_comment_ranges(tree, parsed.content_bytes, is_index_d_ts), args.repeat)
+        assert walk_ranges == query_ranges == lookup_ranges, f"{name}: the strategies returned different comments"
+
+        print(f"{name}: {len(parsed.content_bytes) / 1e6:.1f} MB, {len(lookup_ranges)} comments, parse {parse_time:.3f}s")
+        print(f"    walk   {walk_time:.3f}s")
+        for label, elapsed in (("query", query_time), ("lookup", lookup_time)):
+            print(f"    {label:<6} {elapsed:.3f}s  ({walk_time / max(elapsed, 1e-9):.1f}x)")
+
+        in_place_time, in_place = timed(
+            lambda: UtilsForAnalyzer._delete_in_place(parsed.content_bytes, lookup_ranges).decode("utf8"), 1)
+        forward_time, (forward, _, _) = timed(lambda: UtilsForAnalyzer.strip_comments(content, name, parsed), args.repeat)
+        assert in_place == forward, f"{name}: the deletion strategies returned different contents"
+        print(f"    in place {in_place_time:.3f}s")
+        print(f"    forward  {forward_time:.3f}s  ({in_place_time / max(forward_time, 1e-9):.1f}x, collection included)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,7 @@
 JSON_FILE = "list_pkg.json"
 ANALYSIS_DIR = "analysis_results"
 CSV_FILENAME = "aggregate_metrics_by_single_version.csv"
+PARQUET_DIR = "parquet"     # Parquet tables of a package (main.py --format parquet), read instead of the CSV files
 CSV_BASE_DIR = "datasets_csv_raw"
 OUTPUT_DIR_AGG = "datasets_csv_raw"
 OUTPUT_DIR_AGG_GT0 = "datasets_csv_gt0"
@@ -8,6 +8,7 @@ For each metric in COLUMNS_TO_EXTRACT it produces two CSV files:
 Output format:
   package, version_-19, version_-18, ..., version_0
 """
+import glob
 import json
 from config import (
     JSON_FILE,
@@ -18,6 +19,7 @@ from config import (
     COLUMNS_PRESENCE,
     CSV_BASE_DIR,
     OUTPUT_DIR_AGG_GT0,
+    PARQUET_DIR,
 )
 import pandas as pd
 import os
@@ -27,6 +29,13 @@ from pathlib import Path
 from packaging.version import parse as parse_version
 from packaging.version import InvalidVersion
 
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:     # Optional, the CSV files are read instead
+    pa = None
+    pq = None
+
 
 # ---------------------------------------------------------------------------
 # Helpers
@@ -45,9 +54,35 @@ def load_package_list():
         return json.load(f)
 
 
+def load_parquet_data(pkg_name_safe: str):
+    """Load the Parquet table of aggregate metrics of one package (main.py --format parquet), None if missing.
+    List columns are stored natively, they are encoded as in the CSV files so the outputs are the same.
+    Only the complete version files are read, not the temporary files of a run in progress or interrupted."""
+    table_dir = os.path.join(ANALYSIS_DIR, pkg_name_safe, PARQUET_DIR, Path(CSV_FILENAME).stem)
+    if pq is None or not os.path.isdir(table_dir):
+        return None
+    files = sorted(glob.glob(os.path.join(glob.escape(table_dir), "*.parquet")))
+    if not files:
+        return None
+    table = pq.read_table(files)
+    columns = {}
+    for field, column in zip(table.schema, table.columns):
+        if pa.types.is_list(field.type):
+            column = pa.array([json.dumps(value, ensure_ascii=False) for value in column.to_pylist()])
+        columns[field.name] = column
+    return pa.table(columns).to_pandas()
+
+
 def load_csv_data(pkg_name: str):
-    """Load aggregate_metrics_by_single_version.csv for one package."""
+    """Load aggregate_metrics_by_single_version.csv (or its Parquet table, if present) for one package."""
     pkg_name_safe = pkg_name.replace("/", "_")
+    try:
+        df = load_parquet_data(pkg_name_safe)
+    except Exception:
+        return "load_error", None
+    if df is not None:
+        return "ok", df
+
     csv_path  = os.path.join(ANALYSIS_DIR, pkg_name_safe, CSV_FILENAME)
     r_csv_path = os.path.join(ANALYSIS_DIR, pkg_name_safe, "R-" + CSV_FILENAME)
 
@@ -1,22 +1,77 @@
 import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from multiprocessing import cpu_count
 from pathlib import Path
 from datetime import datetime
-from utils import FileHandler, setup_logging, close_logging, synchronized_print
+from dataclasses import replace
+from typing import Dict, Optional
+from utils import FileHandler, FileTypeDetector, MetricsStore, ProgressManifest, setup_logging, close_logging, synchronized_print
+from reporters import ParquetReporter
 from analyze_single_package import analyze_single_package
+from analyzers.worker_pool import WorkerPool
+from analyzers.code_analyzer import CodeAnalyzer
+from models import AnalysisOptions
 import time
 
 def main():
     parser = argparse.ArgumentParser(description='Analyzer npm package releases')
-    parser.add_argument('--json', required=True)
+    parser.add_argument('--json')
     parser.add_argument('--output', default='analysis_results', help='Output directory (default: analysis_results)')
     parser.add_argument('--workers', type=int, default=cpu_count(), help=f'Number of workers (default: {cpu_count()})')
+    parser.add_argument('--package-concurrency', type=int, default=1, help='Number of packages analyzed at the same time, sharing the --workers budget (default: 1)')
     parser.add_argument('--log', default='log.txt', help='Log file (default: log.txt)')
     parser.add_argument('--local', action='store_true', help='Include local versions from local_versions directory (default: False)')
     parser.add_argument('--local-dir', default='./local_versions', help='Directory for local versions (default: ./local_versions)')
     parser.add_argument('--delete-analysis', action='store_true', help='Delete previous analysis results before running (default: False)')
+    parser.add_argument('--stream', action='store_true', help='Analyze tarballs in memory without extracting them to disk (default: False)')
+    parser.add_argument('--registry', default='https://registry.npmjs.org', help='npm registry URL (default: https://registry.npmjs.org)')
+    parser.add_argument('--metadata-cache', default='metadata_cache', help='Directory of cached registry metadata, revalidated on each run (default: metadata_cache)')
+    parser.add_argument('--no-metadata-cache', action='store_true', help='Do not cache registry metadata on disk (default: False)')
+    parser.add_argument('--metadata-timeout', type=float, default=30, help='Registry metadata timeout in seconds (default: 30)')
+    parser.add_argument('--full-metadata', action='store_true', help='Request the full packument instead of the abbreviated install metadata (default: False)')
+    parser.add_argument('--download-workers', type=int, default=8, help='Concurrent tarball downloads per package (default: 8)')
+    parser.add_argument('--download-per-host', type=int, default=4, help='Concurrent connections to the same host (default: 4)')
+    parser.add_argument('--download-timeout', type=float, default=30, help='Download timeout in seconds (default: 30)')
+    parser.add_argument('--download-chunk-kb', type=int, default=64, help='Chunk size used to stream tarballs to disk, in KB (default: 64)')
+    parser.add_argument('--store', default=None, help='SQLite metrics store reused between runs (default: disabled)')
+    parser.add_argument('--store-max-mb', type=int, default=1024, help='Size bound of the metrics store in MB (default: 1024)')
+    parser.add_argument('--type-fast-path', choices=['off', 'magic', 'all'], default='magic', help='Files labeled without the Magika model: none, empty files and binary signatures (png, gif, woff), or also LICENSE files (default: magic)')
+    parser.add_argument('--type-batch-size', type=int, default=1, help='Files identified per Magika model run (default: 1)')
+    parser.add_argument('--diff-versions', action='store_true', help='Analyze only the files added or modified since the previous version, write version_diff.csv (default: False)')
+    parser.add_argument('--resume', action='store_true', help='Resume an interrupted run into the same --output: skip the completed packages and versions (default: False)')
+    parser.add_argument('--format', choices=['csv', 'parquet', 'both'], default='csv', help='Output format, parquet needs pyarrow (default: csv)')
+    parser.add_argument('--stream-results', action='store_true', help='Aggregate file results and write their rows as they arrive, in completion order, without keeping a whole version in memory (default: False)')
+    parser.add_argument('--sketch-matches', type=int, default=0, metavar='K', help='Lists of more than K matches keep only their K most frequent distinct matches, summarized while the files are scanned, unique counts beyond K distinct matches are estimated with a HyperLogLog sketch, memory per file and version stays bounded (default: 0, exact lists)')
+    parser.add_argument('--invalidate-store', choices=['stale', 'all'], default=None, help='Delete store entries of other analyzer/pattern versions (stale) or all of them, then exit if no --json is given')
     args = parser.parse_args()
 
+    if args.invalidate_store:
+        if not args.store:
+            parser.error('--invalidate-store requires --store')
+        store = MetricsStore(args.store, CodeAnalyzer.fingerprint(args.type_fast_path, args.sketch_matches), args.store_max_mb, FileTypeDetector.fingerprint())
+        store.invalidate(all_entries=args.invalidate_store == 'all')
+        store.close()
+        if not args.json:
+            return
+    if not args.json:
+        parser.error('the following arguments are required: --json')
+
+    if args.format != 'csv' and not ParquetReporter.available():
+        parser.error(f'--format {args.format} requires pyarrow')
+
+    if args.resume and args.delete_analysis:
+        parser.error('--resume cannot be used with --delete-analysis')
+
+    if args.stream_results and args.diff_versions:
+        # Files carried forward to the next version are kept by path
+        parser.error('--stream-results cannot be used with --diff-versions')
+
+    if args.sketch_matches < 0:
+        parser.error('--sketch-matches must be positive')
+    if args.sketch_matches and args.diff_versions:
+        # Removed and modified files would have to be taken out of the sketches of the version
+        parser.error('--sketch-matches cannot be used with --diff-versions')
+
     if args.delete_analysis:
         FileHandler.delete_previous_analysis()
     
@@ -33,25 +88,98 @@ def main():
         synchronized_print('NPM PACKAGE ANALYZER')
         synchronized_print(f'Packages to analyze: {len(packages)}')
         synchronized_print(f'Worker(s): {args.workers}')
+        synchronized_print(f'Package concurrency: {args.package_concurrency}')
         synchronized_print(f'Output directory: {args.output}')
         synchronized_print(f'Include local versions: {args.local}')
         if args.local:
             synchronized_print(f'Local versions directory: {args.local_dir}')
+        synchronized_print(f'Streaming tarballs: {args.stream}')
+        synchronized_print(f'Diff between versions: {args.diff_versions}')
+        if args.store:
+            synchronized_print(f'Metrics store: {args.store}')
+        synchronized_print(f'Resume: {args.resume}')
+        synchronized_print(f'Output format: {args.format}')
+        synchronized_print(f'Streaming results: {args.stream_results}')
+        if args.sketch_matches:
+            synchronized_print(f'Sketched match lists: top {args.sketch_matches}')
         synchronized_print(f'Log: {args.log}')
         synchronized_print('=' * 50)
 
         Path(args.output).mkdir(parents=True, exist_ok=True)
 
+        progress = ProgressManifest(Path(args.output) / ProgressManifest.FILE_NAME)
+        completed_versions = {}
+        if args.resume:
+            progress.repair()
+            completed, completed_versions = progress.completed()
+            if completed:
+                synchronized_print(f'Skipping {sum(pkg in completed for pkg in packages)} package(s) completed by the previous run')
+                packages = [pkg for pkg in packages if pkg not in completed]
+        else:
+            progress.reset()
+
         start_time = time.time()
-        for i, pkg in enumerate(packages):
-            analyze_single_package(pkg, args.output, i+1, len(packages), args.local, args.local_dir, args.workers)
+        run_packages(packages, args, completed_versions)
         
         total_time = time.time() - start_time
         synchronized_print(f'=== ANALYSIS COMPLETED. Total time: {total_time:.1f}s ===')
         synchronized_print(f"=== LOG ANALYSIS ENDED {datetime.now().strftime('%Y-%m-%d %H:%M:%S')} ===")
 
     finally:
+        WorkerPool.close()
         close_logging()
 
+def workers_per_package(total_workers: int, package_concurrency: int) -> int:
+    """Split the core budget between the packages that are in flight at the same time"""
+    return max(1, total_workers // max(1, package_concurrency))
+
+def run_packages(packages: list, args: argparse.Namespace, completed_versions: Optional[Dict[str, Dict[str, Dict[str, int]]]] = None) -> None:
+    """Run the package pipelines, at most --package-concurrency at a time.
+    completed_versions: versions finished by the resumed run, by package (see ProgressManifest.completed)"""
+    completed_versions = completed_versions or {}
+    concurrency = max(1, min(args.package_concurrency, len(packages)))
+    workers = workers_per_package(args.workers, concurrency)
+    options = AnalysisOptions(
+        store_path=args.store,
+        store_max_mb=args.store_max_mb,
+        stream=args.stream,
+        registry_url=args.registry,
+        metadata_cache_dir=None if args.no_metadata_cache else args.metadata_cache,
+        metadata_timeout=args.metadata_timeout,
+        full_metadata=args.full_metadata,
+        download_workers=args.download_workers,
+        download_per_host=args.download_per_host,
+        download_timeout=args.download_timeout,
+        download_chunk_kb=args.download_chunk_kb,
+        type_fast_path=args.type_fast_path,
+        type_batch_size=args.type_batch_size,
+        diff_versions=args.diff_versions,
+        progress_path=str(Path(args.output) / ProgressManifest.FILE_NAME),
+        resume=args.resume,
+        output_format=args.format,
+        stream_results=args.stream_results,
+        sketch_top_k=args.sketch_matches,
+    )
+
+    def package_options(pkg: str) -> AnalysisOptions:
+        return replace(options, completed_versions=completed_versions.get(pkg, {}))
+
+    if concurrency == 1:
+        for i, pkg in enumerate(packages):
+            analyze_single_package(pkg, args.output, i+1, len(packages), args.local, args.local_dir, workers, package_options(pkg))
+        return
+
+    # Each package runs in its own (non-daemon) process, so it can still start its own worker pool
+    with ProcessPoolExecutor(max_workers=concurrency) as executor:
+        futures = {
+            executor.submit(analyze_single_package, pkg, args.output, i+1, len(packages), args.local, args.local_dir, workers, package_options(pkg)): pkg
+            for i, pkg in enumerate(packages)
+        }
+        for future in as_completed(futures):
+            try:
+                future.result()
+            except Exception as e:
+                synchronized_print(f"Error analyzing package {futures[future]}: {type(e).__name__}: {e}")
+
 if __name__ == '__main__':
     main()
\ No newline at end of file
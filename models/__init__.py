@@ -1,4 +1,6 @@
 from .version_entry import VersionEntry, SourceType
 from .code_type import CodeType
+from .analysis_options import AnalysisOptions
+from .match_sketch import MatchSketch, MatchTally
 
-__all__ = ["VersionEntry", "CodeType", "SourceType"]
\ No newline at end of file
+__all__ = ["VersionEntry", "CodeType", "SourceType", "AnalysisOptions", "MatchSketch", "MatchTally"]
\ No newline at end of file
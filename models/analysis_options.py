@@ -0,0 +1,26 @@
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+
+@dataclass
+class AnalysisOptions:
+    '''Run-wide settings passed from main.py down to the analyzers'''
+    store_path: Optional[str] = None    # Persistent metrics store (SQLite), disabled if None
+    store_max_mb: int = 1024            # Size bound of the store, least recently used entries are evicted
+    stream: bool = False                # Analyze tarballs in memory instead of extracting them to disk
+    registry_url: str = "https://registry.npmjs.org"
+    metadata_cache_dir: Optional[str] = "metadata_cache"   # Registry documents revalidated with ETag/Last-Modified, disabled if None
+    metadata_timeout: float = 30        # Seconds, large documents need more than the tarballs
+    full_metadata: bool = False         # Request the full packument instead of the abbreviated install metadata
+    download_workers: int = 8           # Concurrent tarball downloads per package
+    download_per_host: int = 4          # Concurrent connections to the same host
+    download_timeout: float = 30        # Seconds, for connect and for each read
+    download_chunk_kb: int = 64         # Bodies are streamed to disk in chunks of this size
+    type_fast_path: str = "magic"       # Files labeled without the Magika model: off, magic (empty files and binary signatures), all (also LICENSE files)
+    type_batch_size: int = 1            # Files identified per Magika model run, batching only pays off where inference is multi-threaded
+    diff_versions: bool = False         # Analyze only the files added or modified since the previous version, carry the others forward
+    progress_path: Optional[str] = None # Manifest of the completed versions and packages of the run, disabled if None
+    resume: bool = False                # Skip the versions completed in the manifest, drop the output written after them
+    completed_versions: Dict[str, Dict[str, int]] = field(default_factory=dict)  # With resume: the versions of the package completed in the manifest, with the output sizes after each one
+    output_format: str = "csv"          # csv, parquet (one file per version and table, needs pyarrow) or both
+    stream_results: bool = False        # Aggregate the file results and write their rows as they arrive (completion order), a version is not kept in memory
+    sketch_top_k: int = 0               # Lists of more than k matches keep their k most frequent distinct ones, unique ones estimated (HyperLogLog), 0 for exact lists
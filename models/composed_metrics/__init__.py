@@ -1,4 +1,5 @@
 from .file_metrics import FileMetrics
 from .version_metrics import VersionMetrics
+from .version_diff import VersionDiff
 
-__all__ = ["FileMetrics", "VersionMetrics"]
\ No newline at end of file
+__all__ = ["FileMetrics", "VersionMetrics", "VersionDiff"]
\ No newline at end of file
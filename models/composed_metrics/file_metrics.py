@@ -1,7 +1,7 @@
 from dataclasses import dataclass, field
 from ..domains import GenericMetrics, EvasionMetrics, CryptoMetrics #PayloadMetrics, ExfiltrationMetrics,
 
-@dataclass
+@dataclass(slots=True)
 class FileMetrics:
     """Metrics for a single file (all int variables represent counts, unless otherwise specified)"""
     package: str = ""
@@ -0,0 +1,12 @@
+from dataclasses import dataclass
+
+@dataclass
+class VersionDiff:
+    """Files of a version compared to the previous one by path, size and content hash"""
+    package: str = ""
+    version: str = ""
+    previous_version: str = ""          # Empty for the first version, all its files are added
+    added_files: int = 0
+    removed_files: int = 0
+    modified_files: int = 0
+    unchanged_files: int = 0
@@ -1,11 +1,13 @@
 from dataclasses import dataclass, field
-from typing import List
+from typing import List, Optional
+from ..match_sketch import MatchSketch
 
-@dataclass
+@dataclass(slots=True)
 class CryptoMetrics:
     crypto_addresses: int = 0
     list_crypto_addresses: List[str] = field(default_factory=list)
     len_list_crypto_addresses_unique: int = 0
+    crypto_addresses_sketch: Optional[MatchSketch] = field(default=None, metadata={'report': False})    # Only with --sketch-matches, a list of more than k matches is replaced by its top k
     """
     cryptocurrency_name: int = 0
     list_cryptocurrency_names: List[str] = field(default_factory=list)
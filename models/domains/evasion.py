@@ -1,10 +1,12 @@
 from dataclasses import dataclass, field
-from typing import List
-@dataclass
+from typing import List, Optional
+from ..match_sketch import MatchSketch
+@dataclass(slots=True)
 class EvasionMetrics:
     obfuscation_patterns_count: int = 0
     list_obfuscation_patterns: List[str] = field(default_factory=list)
     len_list_obfuscation_patterns_unique: int = 0
+    obfuscation_patterns_sketch: Optional[MatchSketch] = field(default=None, metadata={'report': False})    # Only with --sketch-matches, a list of more than k matches is replaced by its top k
     """
     possible_obfuscated: bool = False
     platform_detections_count: int = 0
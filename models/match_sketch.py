@@ -0,0 +1,127 @@
+import hashlib
+import math
+from collections import Counter
+from typing import Dict, Iterable, List, Optional
+
+class MatchSketch:
+    """Bounded summary of a list of matches: the K most frequent matches with their counts, and a HyperLogLog sketch
+    of the distinct matches once there are more than K of them (until then the unique count is exact).
+    Sketches merge, so the sketches of the files of a version give the one of the version, in bounded memory"""
+
+    __slots__ = ('k', 'counts', 'registers')
+
+    PRECISION = 12                      # 4096 registers, standard error 1.04 / sqrt(4096) = 1.6%
+    REGISTERS = 1 << PRECISION
+    HASH_BITS = 64
+
+    def __init__(self, k: int):
+        self.k = k
+        self.counts: Dict[str, int] = {}            # All the matches while there are at most k, then the top k
+        self.registers: Optional[bytearray] = None  # Created when the matches no longer fit in counts
+
+    @classmethod
+    def of(cls, values: Iterable[str], k: int) -> "MatchSketch":
+        sketch = cls(k)
+        sketch._add_counts(Counter(values))
+        return sketch
+
+    def add(self, value: str) -> None:
+        """Count a single match as it is found (Space-Saving): once k distinct matches are kept, a new one replaces the
+        least frequent and inherits its count, so the frequent matches stay and their counts are upper bounds"""
+        counts = self.counts
+        if value in counts:
+            counts[value] += 1
+            return
+        if len(counts) < self.k:
+            counts[value] = 1
+            if self.registers is not None:
+                self._add_hash(value)
+            return
+        self._dense()
+        self._add_hash(value)
+        least = min(counts, key=counts.__getitem__)
+        counts[value] = counts.pop(least) + 1
+
+    def merge(self, other: "MatchSketch") -> None:
+        if other.registers is not None:
+            registers = self._dense()
+            for i, rank in enumerate(other.registers):
+                if rank > registers[i]:
+                    registers[i] = rank
+        self._add_counts(other.counts)
+
+    def top(self) -> List[str]:
+        """Most frequent matches first"""
+        return sorted(self.counts, key=lambda value: (-self.counts[value], value))
+
+    def unique(self) -> int:
+        if self.registers is None:
+            return len(self.counts)
+        m = self.REGISTERS
+        zeros = self.registers.count(0)
+        estimate = 0.7213 / (1 + 1.079 / m) * m * m / sum(2.0 ** -rank for rank in self.registers)
+        if estimate <= 2.5 * m and zeros:
+            # Small range correction (linear counting)
+            estimate = m * math.log(m / zeros)
+        # The k matches kept are known to be distinct
+        return max(len(self.counts), round(estimate))
+
+    def _add_counts(self, counts: Dict[str, int]) -> None:
+        for value, count in counts.items():
+            self.counts[value] = self.counts.get(value, 0) + count
+            if self.registers is not None:
+                self._add_hash(value)
+        if len(self.counts) > self.k:
+            if self.registers is None:
+                # Every distinct match is still in counts, they are all hashed before some are dropped
+                self._dense()
+            self.counts = {value: self.counts[value] for value in self.top()[:self.k]}
+
+    def _dense(self) -> bytearray:
+        if self.registers is None:
+            self.registers = bytearray(self.REGISTERS)
+            for value in self.counts:
+                self._add_hash(value)
+        return self.registers
+
+    def _add_hash(self, value: str) -> None:
+        # Stable across processes, unlike hash()
+        digest = hashlib.blake2b(value.encode('utf8', 'surrogatepass'), digest_size=8).digest()
+        h = int.from_bytes(digest, 'big')
+        rest_bits = self.HASH_BITS - self.PRECISION
+        index = h >> rest_bits
+        rank = rest_bits - (h & ((1 << rest_bits) - 1)).bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+
+class MatchTally:
+    """Matches of one group in a file, summarized while the file is scanned (see PatternSet.scan): their number, the
+    matches themselves while there are at most k, and their sketch. Memory stays bounded by k whatever the file"""
+
+    __slots__ = ('count', 'matches', 'sketch')
+
+    def __init__(self, k: int):
+        self.count = 0
+        self.matches: Optional[List[str]] = []     # Dropped at the k+1-th match
+        self.sketch = MatchSketch(k)
+
+    def __len__(self) -> int:
+        return self.count
+
+    def append(self, value: str) -> None:
+        self.count += 1
+        self.sketch.add(value)
+        if self.matches is not None:
+            if self.count > self.sketch.k:
+                self.matches = None
+            else:
+                self.matches.append(value)
+
+    def values(self) -> List[str]:
+        """All the matches in order while there are at most k, else the k most frequent distinct ones"""
+        return self.matches if self.matches is not None else self.sketch.top()
+
+    def unique(self) -> int:
+        """Exact while there are at most k distinct matches, estimated beyond"""
+        return self.sketch.unique()
@@ -1,5 +1,7 @@
 from dataclasses import dataclass
 from enum import Enum
+from pathlib import Path
+from typing import Optional
 
 class SourceType(Enum):
     LOCAL = "local"
@@ -9,4 +11,5 @@ class VersionEntry:
     '''Represents a specific version entry of a package'''
     name: str           # e.g. 1.1.2, 1.1.1-local, 2.1.0-candidate, posthog-node@5.18.0
     source: SourceType
-    ref: object         # Local Path
\ No newline at end of file
+    ref: object         # Local Path
+    tarball: Optional[Path] = None      # Source .tgz, if any
\ No newline at end of file
@@ -1,3 +1,7 @@
 from .csv_reporter import CSVReporter
+from .csv_writer import CSVWriter
+from .parquet_reporter import ParquetReporter
+from .parquet_writer import ParquetWriter
+from .schema import Schema
 
-__all__ = ['CSVReporter']
\ No newline at end of file
+__all__ = ['CSVReporter', 'CSVWriter', 'ParquetReporter', 'ParquetWriter', 'Schema']
\ No newline at end of file
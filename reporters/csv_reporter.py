@@ -1,6 +1,6 @@
 import csv
 import json
-from dataclasses import is_dataclass, asdict
+from dataclasses import fields, is_dataclass
 from enum import Enum
 from pathlib import Path
 from typing import Any, Dict, List, Union
@@ -72,7 +72,8 @@ class CSVReporter:
         elif isinstance(value, datetime):
             return value.isoformat()
         elif is_dataclass(value):
-            return asdict(value)
+            # Fields with metadata {'report': False} are not reported, see Schema
+            return {f.name: CSVReporter.normalize_value(getattr(value, f.name)) for f in fields(value) if f.metadata.get('report', True)}
         elif isinstance(value, list):
             return [CSVReporter.normalize_value(v) for v in value]
         elif isinstance(value, dict):
@@ -0,0 +1,84 @@
+import csv
+import json
+from enum import Enum
+from operator import attrgetter
+from pathlib import Path
+from typing import Any, Callable, List, Optional, Tuple, Union
+from utils import synchronized_print
+from .schema import Schema
+
+class CSVWriter:
+    """CSV table that stays open while rows are appended, e.g. for all the versions of a package.
+    The column layout is compiled once from the dataclass of the first row (see Schema): each row is read with a single
+    attrgetter over all the columns, only list and enum cells are converted. The cells are the same as CSVReporter.save_csv.
+    The file is opened on the first write (so it can be truncated before), the header is written only to a new file"""
+
+    def __init__(self, output_path: Path):
+        self.output_path = output_path
+        self._file = None
+        self._writer = None
+        self._values: Optional[Callable[[Any], Tuple]] = None
+        self._converters: List[Tuple[int, Callable[[Any], Any]]] = []
+
+    def _compile(self, schema: Schema) -> None:
+        getter = attrgetter(*schema.names)
+        self._values = getter if len(schema.names) > 1 else (lambda item: (getter(item),))
+        self._converters = []
+        for i, column in enumerate(schema.columns):
+            if column.kind is list:
+                item_is_enum = isinstance(column.item_kind, type) and issubclass(column.item_kind, Enum)
+                self._converters.append((i, self._list_cell if item_is_enum else self._json_cell))
+            elif issubclass(column.kind, Enum):
+                self._converters.append((i, Schema.plain))
+
+    @staticmethod
+    def _json_cell(value: List) -> str:
+        return json.dumps(value, ensure_ascii=False)
+
+    @staticmethod
+    def _list_cell(value: List) -> str:
+        return json.dumps([Schema.plain(v) for v in value], ensure_ascii=False)
+
+    def _open(self, schema: Schema) -> None:
+        self.output_path.parent.mkdir(parents=True, exist_ok=True)
+        is_new = not self.output_path.exists() or self.output_path.stat().st_size == 0
+        self._file = open(self.output_path, "a", newline="", encoding="utf-8")
+        self._writer = csv.writer(self._file)
+        if is_new:
+            self._writer.writerow(schema.names)
+
+    def write(self, data: Union[Any, List[Any]]) -> None:
+        items = data if isinstance(data, list) else [data]
+
+        if not items:
+            synchronized_print(f"No data to save in {self.output_path}")
+            return
+
+        try:
+            if self._values is None:
+                schema = Schema.of(type(items[0]))
+                self._compile(schema)
+                self._open(schema)
+            values = self._values
+            converters = self._converters
+            rows = []
+            for item in items:
+                row = list(values(item))
+                for i, convert in converters:
+                    row[i] = convert(row[i])
+                rows.append(row)
+            self._writer.writerows(rows)
+
+        except Exception as e:
+            synchronized_print(f"Error saving CSV to {self.output_path}: {e}")
+
+    def flush(self) -> None:
+        if self._file is not None:
+            self._file.flush()
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+        self._file = None
+        self._writer = None
+        self._values = None
@@ -0,0 +1,104 @@
+import os
+from enum import Enum
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Iterable, List, Union
+from utils import synchronized_print
+from .schema import Column, Schema
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:     # Optional, only needed for --format parquet
+    pa = None
+    pq = None
+
+class ParquetReporter:
+    """Generate Parquet files with analysis results, with the schema derived from the dataclasses.
+    Each table is a directory with one file per version, written at once (to a temporary file, then renamed),
+    so a directory is read as a single dataset and a crash leaves no partial version file (only a temporary file,
+    see temp_path). List fields are list columns"""
+
+    @staticmethod
+    def available() -> bool:
+        return pa is not None
+
+    @staticmethod
+    def file_name(version: str) -> str:
+        return version.replace('/', '_') + ".parquet"
+
+    @staticmethod
+    @lru_cache(maxsize=None)
+    def arrow_schema(schema: Schema) -> "pa.Schema":
+        return pa.schema([pa.field(column.name, ParquetReporter._arrow_type(column)) for column in schema.columns])
+
+    @staticmethod
+    def _arrow_type(column: Column) -> "pa.DataType":
+        if column.kind is list:
+            return pa.list_(ParquetReporter._scalar_type(column.item_kind))
+        return ParquetReporter._scalar_type(column.kind)
+
+    @staticmethod
+    def _scalar_type(kind: type) -> "pa.DataType":
+        # bool before int, it is a subclass
+        if issubclass(kind, bool):
+            return pa.bool_()
+        if issubclass(kind, Enum):
+            return pa.string()
+        if issubclass(kind, int):
+            return pa.int64()
+        if issubclass(kind, float):
+            return pa.float64()
+        return pa.string()
+
+    @staticmethod
+    def save_parquet(table_dir: Path, version: str, data: Union[Any, List[Any]]) -> None:
+        items = data if isinstance(data, list) else [data]
+
+        if not items:
+            synchronized_print(f"No data to save in {table_dir}")
+            return
+
+        try:
+            table_dir.mkdir(parents=True, exist_ok=True)
+            output_path = table_dir / ParquetReporter.file_name(version)
+            temp_path = ParquetReporter.temp_path(output_path)
+            pq.write_table(ParquetReporter.to_table(items), temp_path)
+            os.replace(temp_path, output_path)
+
+        except Exception as e:
+            synchronized_print(f"Error saving Parquet to {table_dir}: {e}")
+
+    @staticmethod
+    def temp_path(output_path: Path) -> Path:
+        """File written before it is renamed to output_path. The _ prefix makes readers of the directory as a
+        dataset (pyarrow, pandas) skip it, so a run in progress or interrupted does not break them"""
+        return output_path.with_name("_" + output_path.name + ".tmp")
+
+    @staticmethod
+    def to_table(items: List[Any]) -> "pa.Table":
+        """Arrow table of the rows of a dataclass (at least one)"""
+        schema = Schema.of(type(items[0]))
+        columns = []
+        for column in schema.columns:
+            values = [column.getter(item) for item in items]
+            if column.kind is list:
+                values = [[Schema.plain(v) for v in value] for value in values]
+            elif issubclass(column.kind, Enum):
+                values = [Schema.plain(value) for value in values]
+            columns.append(values)
+        arrow_schema = ParquetReporter.arrow_schema(schema)
+        return pa.Table.from_arrays(
+            [pa.array(values, type=field.type) for values, field in zip(columns, arrow_schema)],
+            schema=arrow_schema,
+        )
+
+    @staticmethod
+    def remove_versions(table_dir: Path, keep: Iterable[str]) -> None:
+        """Remove the files of the versions not in keep, and temporary files left by a crash"""
+        if not table_dir.is_dir():
+            return
+        kept = {ParquetReporter.file_name(version) for version in keep}
+        for path in table_dir.iterdir():
+            if path.name not in kept:
+                path.unlink()
@@ -0,0 +1,53 @@
+import os
+from pathlib import Path
+from typing import Any, List, Union
+from utils import synchronized_print
+from .parquet_reporter import ParquetReporter, pq
+
+class ParquetWriter:
+    """Parquet file of a version whose rows are appended as they are produced, one row group per write.
+    Like ParquetReporter.save_parquet the rows go to a temporary file, renamed when the version is complete. The file
+    stays open while the version is analyzed, its name (see ParquetReporter.temp_path) keeps it out of the dataset"""
+
+    def __init__(self, table_dir: Path, version: str):
+        self.output_path = table_dir / ParquetReporter.file_name(version)
+        self._temp_path = ParquetReporter.temp_path(self.output_path)
+        self._writer = None
+
+    def write(self, data: Union[Any, List[Any]]) -> None:
+        items = data if isinstance(data, list) else [data]
+        if not items:
+            return
+
+        try:
+            table = ParquetReporter.to_table(items)
+            if self._writer is None:
+                self.output_path.parent.mkdir(parents=True, exist_ok=True)
+                self._writer = pq.ParquetWriter(self._temp_path, table.schema)
+            self._writer.write_table(table)
+
+        except Exception as e:
+            synchronized_print(f"Error saving Parquet to {self.output_path}: {e}")
+
+    def close(self) -> None:
+        """Complete the file, nothing is written for a version without rows"""
+        if self._writer is None:
+            return
+        try:
+            self._writer.close()
+            os.replace(self._temp_path, self.output_path)
+        except Exception as e:
+            synchronized_print(f"Error saving Parquet to {self.output_path}: {e}")
+            self._temp_path.unlink(missing_ok=True)
+        self._writer = None
+
+    def abort(self) -> None:
+        """Drop the rows of a version that could not be completed"""
+        if self._writer is None:
+            return
+        try:
+            self._writer.close()
+        except Exception:
+            pass
+        self._temp_path.unlink(missing_ok=True)
+        self._writer = None
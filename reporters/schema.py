@@ -0,0 +1,53 @@
+import dataclasses
+import typing
+from enum import Enum
+from functools import lru_cache
+from operator import attrgetter
+from typing import Any, Callable, List, NamedTuple, Optional, Tuple
+
+class Column(NamedTuple):
+    name: str                       # Dotted name, the same as the CSV header (e.g. generic.file_type)
+    path: Tuple[str, ...]           # Attributes from the top level object
+    kind: type                      # int, float, bool, str, an Enum or list
+    item_kind: Optional[type]       # Type of the items of a list column
+    getter: Callable[[Any], Any]
+
+class Schema:
+    """Flat columns of a metrics dataclass, derived once per class from its type annotations.
+    Nested dataclasses are expanded in place with dotted names, in the same order as CSVReporter.flatten.
+    Fields with metadata {'report': False} are internal state, they are not columns"""
+
+    def __init__(self, cls: type):
+        self.cls = cls
+        self.columns: List[Column] = list(self._columns(cls, ()))
+
+    @staticmethod
+    @lru_cache(maxsize=None)
+    def of(cls: type) -> "Schema":
+        return Schema(cls)
+
+    @property
+    def names(self) -> List[str]:
+        return [column.name for column in self.columns]
+
+    @classmethod
+    def _columns(cls, data_class: type, path: Tuple[str, ...]):
+        hints = typing.get_type_hints(data_class)
+        for f in dataclasses.fields(data_class):
+            if not f.metadata.get('report', True):
+                continue
+            kind = hints[f.name]
+            field_path = path + (f.name,)
+            if dataclasses.is_dataclass(kind):
+                yield from cls._columns(kind, field_path)
+                continue
+            item_kind = None
+            if typing.get_origin(kind) in (list, List):
+                item_kind = (typing.get_args(kind) or (str,))[0]
+                kind = list
+            yield Column(".".join(field_path), field_path, kind, item_kind, attrgetter(".".join(field_path)))
+
+    @staticmethod
+    def plain(value: Any) -> Any:
+        """Enums are reported by value"""
+        return value.value if isinstance(value, Enum) else value
@@ -0,0 +1,152 @@
+import base64
+import hashlib
+import http.server
+import json
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+from utils import NPMClient, TarballDownloader
+from utils.tarball_downloader import IntegrityError
+
+PACKAGE = "demo"
+VERSIONS = [f"1.0.{i}" for i in range(20)]
+
+class RegistryHandler(http.server.BaseHTTPRequestHandler):
+    """Stand-in registry: the abbreviated document of PACKAGE and its tarballs, see RegistryTestCase"""
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        registry = self.server.registry
+        path = self.path.lstrip("/")
+        with registry.lock:
+            registry.requests.append(path)
+        if path == PACKAGE:
+            self._send(json.dumps(registry.packument).encode())
+        elif path in registry.bodies:
+            self._send(registry.corrupted.get(path, registry.bodies[path]))
+        else:
+            self._send(b"", status=404)
+
+    def _send(self, body: bytes, status: int = 200):
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+class RegistryTestCase(unittest.TestCase):
+    def setUp(self):
+        self.server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), RegistryHandler)
+        self.server.daemon_threads = True
+        self.server.registry = self
+        self.lock = threading.Lock()
+        self.requests = []
+        self.corrupted = {}     # Served instead of the real body, by path
+        self.registry_url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self.bodies = {}
+        versions = {}
+        for i, version in enumerate(VERSIONS):
+            path = f"tarballs/{PACKAGE}-{version}.tgz"
+            body = f"tarball of {version}".encode()
+            self.bodies[path] = body
+            dist = {"tarball": f"{self.registry_url}/{path}"}
+            # Even versions have an SRI integrity, odd ones only the legacy sha1 shasum
+            if i % 2 == 0:
+                dist["integrity"] = "sha512-" + base64.b64encode(hashlib.sha512(body).digest()).decode()
+            else:
+                dist["shasum"] = hashlib.sha1(body).hexdigest()
+            versions[version] = {"name": PACKAGE, "version": version, "dist": dist}
+        self.packument = {"name": PACKAGE, "versions": versions}
+        thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        thread.start()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.download_dir = Path(self.tmp.name)
+        self.pkg_dir = self.download_dir / PACKAGE
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.tmp.cleanup()
+
+    def download(self):
+        client = NPMClient(registry_url=self.registry_url, pkg_name=PACKAGE, downloader=TarballDownloader(max_workers=4))
+        return client.download_package_versions_tarball(self.download_dir, extract=False)
+
+    def tarball_requests(self, version: str) -> int:
+        return self.requests.count(f"tarballs/{PACKAGE}-{version}.tgz")
+
+    def assert_no_part_files(self):
+        self.assertEqual(list(self.download_dir.rglob("*.part")), [])
+
+class TestTarballDownloader(RegistryTestCase):
+    def test_downloads_and_verifies_every_version(self):
+        entries = self.download()
+        self.assertEqual([entry.name for entry in entries], VERSIONS)
+        for version in VERSIONS:
+            self.assertEqual((self.pkg_dir / f"{version}.tgz").read_bytes(), f"tarball of {version}".encode())
+        self.assert_no_part_files()
+
+    def test_verified_tarballs_are_not_downloaded_again(self):
+        self.download()
+        self.requests.clear()
+        self.download()
+        self.assertEqual(self.requests, [PACKAGE])
+
+    def test_corrupted_tarballs_are_downloaded_again(self):
+        self.download()
+        # 1.0.0 is verified with sha512 (SRI), 1.0.1 with sha1 (shasum)
+        for version in ("1.0.0", "1.0.1"):
+            (self.pkg_dir / f"{version}.tgz").write_bytes(b"truncated")
+        self.requests.clear()
+        entries = self.download()
+        self.assertEqual(len(entries), len(VERSIONS))
+        for version in ("1.0.0", "1.0.1"):
+            self.assertEqual(self.tarball_requests(version), 1)
+            self.assertEqual((self.pkg_dir / f"{version}.tgz").read_bytes(), f"tarball of {version}".encode())
+        self.assertEqual(self.tarball_requests("1.0.2"), 0)
+        self.assert_no_part_files()
+
+    def test_mismatching_body_is_discarded(self):
+        for version in ("1.0.0", "1.0.1"):
+            self.corrupted[f"tarballs/{PACKAGE}-{version}.tgz"] = b"not the published tarball"
+        entries = self.download()
+        self.assertEqual([entry.name for entry in entries], VERSIONS[2:])
+        for version in ("1.0.0", "1.0.1"):
+            self.assertFalse((self.pkg_dir / f"{version}.tgz").exists())
+        self.assert_no_part_files()
+
+        # Once the registry serves the right body, the next run downloads them
+        self.corrupted.clear()
+        self.requests.clear()
+        entries = self.download()
+        self.assertEqual([entry.name for entry in entries], VERSIONS)
+        self.assertEqual(self.tarball_requests("1.0.0"), 1)
+        self.assertEqual(self.tarball_requests("1.0.2"), 0)
+
+    def test_integrity_error_keeps_the_previous_file(self):
+        path = f"tarballs/{PACKAGE}-1.0.0.tgz"
+        destination = self.download_dir / "1.0.0.tgz"
+        destination.write_bytes(b"previous")
+        self.corrupted[path] = b"not the published tarball"
+        expected = ("sha1", hashlib.sha1(self.bodies[path]).digest())
+        with self.assertRaises(IntegrityError):
+            TarballDownloader().download(f"{self.registry_url}/{path}", destination, expected)
+        self.assertEqual(destination.read_bytes(), b"previous")
+        self.assert_no_part_files()
+
+    def test_expected_digest_prefers_the_strongest_algorithm(self):
+        body = b"body"
+        dist = {
+            "integrity": "sha1-" + base64.b64encode(hashlib.sha1(body).digest()).decode()
+                         + " sha512-" + base64.b64encode(hashlib.sha512(body).digest()).decode(),
+            "shasum": hashlib.sha1(body).hexdigest(),
+        }
+        self.assertEqual(TarballDownloader.expected_digest(dist), ("sha512", hashlib.sha512(body).digest()))
+        self.assertEqual(TarballDownloader.expected_digest({"shasum": dist["shasum"]}), ("sha1", hashlib.sha1(body).digest()))
+        self.assertIsNone(TarballDownloader.expected_digest({}))
+
+if __name__ == "__main__":
+    unittest.main()
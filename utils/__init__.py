@@ -1,8 +1,15 @@
 from .npm_client import NPMClient
 from .file_handler import FileHandler
 from .logging_utils import synchronized_print, setup_logging, close_logging
+from .offset_map import OffsetMap
+from .parsed_file import ParsedFile
 from .utils_for_analyzer import UtilsForAnalyzer
+from .pattern_set import PatternSet
 from .file_type_detector import FileTypeDetector
+from .metrics_store import MetricsStore
+from .tarball_downloader import TarballDownloader
+from .progress_manifest import ProgressManifest
+from .string_table import StringTable
 
 __all__ = [
     'NPMClient',
@@ -10,6 +17,13 @@ __all__ = [
     'synchronized_print',
     'setup_logging',
     'close_logging',
+    'OffsetMap',
+    'ParsedFile',
     'UtilsForAnalyzer',
+    'PatternSet',
     'FileTypeDetector',
+    'MetricsStore',
+    'TarballDownloader',
+    'ProgressManifest',
+    'StringTable',
 ]
\ No newline at end of file
@@ -1,7 +1,11 @@
+from contextlib import contextmanager
 from pathlib import Path
-from typing import List
+from typing import Iterator, List, Tuple, Union
 import json
+import hashlib
+import mmap
 import shutil
+import tarfile
 import os
 from utils.logging_utils import synchronized_print
 
@@ -37,14 +41,59 @@ class FileHandler:
     @staticmethod
     def read_file(file_path: Path) -> str:
         try:
-            return file_path.read_text(encoding="utf-8")
-        except UnicodeDecodeError:
-            synchronized_print(f"   Non-UTF8 file, skipped: {file_path.name}")
-            return ""
+            return FileHandler.decode_content(file_path.read_bytes(), file_path.name)
         except Exception as e:
             synchronized_print(f"Error reading {file_path}: {e}")
             return ""
 
+    @staticmethod
+    @contextmanager
+    def map_file(file_path: Path) -> Iterator[Union[mmap.mmap, bytes]]:
+        """Read-only memory map of a file, unmapped on exit. Empty files cannot be mapped and give b''"""
+        with open(file_path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                yield b''
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                yield mapped
+
+    @staticmethod
+    def decode_content(data: bytes, file_name: str) -> str:
+        """Same as read_file, for content that comes from memory.
+        Non-UTF8 files are analyzed too, their invalid bytes are replaced (U+FFFD)"""
+        try:
+            return data.decode("utf-8")
+        except UnicodeDecodeError:
+            return data.decode("utf-8", errors="replace")
+
+    @staticmethod
+    def read_tarball_members(tarball_path: Path) -> List[Tuple[str, bytes]]:
+        """Read the regular files of a .tgz in a single sequential pass, without extracting them to disk"""
+        members = []
+        with tarfile.open(tarball_path, 'r|gz') as tar:
+            for member in tar:
+                if not member.isfile():
+                    continue
+                f = tar.extractfile(member)
+                if f is None:
+                    continue
+                name = member.name[2:] if member.name.startswith('./') else member.name
+                members.append((name, f.read()))
+        return members
+
+    @staticmethod
+    def hash_bytes(data: bytes) -> str:
+        return hashlib.sha256(data).hexdigest()
+
+    @staticmethod
+    def hash_file(file_path: Path) -> str:
+        """SHA-256 of the file content, used as content address for cached results"""
+        digest = hashlib.sha256()
+        with open(file_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
     @staticmethod
     def delete_previous_analysis() -> None:
         dirs_to_delete = ['analysis_results', 'local_versions/extracted']
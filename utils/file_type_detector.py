@@ -1,11 +1,21 @@
-from pathlib import Path
-from typing import Optional
+import hashlib
+import io
+from collections import OrderedDict
+from pathlib import Path, PurePath
+from typing import List, Optional, Sequence, Union
+import magika as magika_package
 from magika import Magika
 
 class FileTypeDetector:
     """Detects file types using Google's Magika"""
     
     _magika_instance: Optional[Magika] = None
+    # Whether the private Magika methods used to batch in-memory contents exist, None until checked (see _identify_contents)
+    _batch_api: Optional[bool] = None
+
+    # Labels of the contents already identified by this process (content hash -> label), least recently used evicted first
+    _type_cache: "OrderedDict[str, str]" = OrderedDict()
+    TYPE_CACHE_SIZE = 200000
     
     # Plain text files
     VALID_TYPES = {
@@ -14,7 +24,29 @@ class FileTypeDetector:
         'json', 'jsonl', 'yaml', 'ini',
         'markdown', # possibile presenza di ind. crypto nel README o CHANGELOG
     }
-    
+
+    # Fast path: unambiguous files labeled without running the model, with the label Magika gives them.
+    # 'magic' covers empty files and the signatures below, 'all' adds the file names (Magika labels a few LICENSE files as markdown or code)
+    FAST_PATH_LEVELS = ('off', 'magic', 'all')
+    # Signatures are followed by the first header bytes, so a payload behind a bare signature still goes to the model
+    FAST_PATH_MAGIC = {
+        b'\x89PNG\r\n\x1a\n\x00\x00\x00\x0dIHDR': 'png',
+        b'GIF87a': 'gif',
+        b'GIF89a': 'gif',
+        b'wOFF\x00\x01\x00\x00': 'woff',
+        b'wOFFOTTO': 'woff',
+        b'wOF2\x00\x01\x00\x00': 'woff2',
+        b'wOF2OTTO': 'woff2',
+    }
+    FAST_PATH_NAMES = {
+        'license': 'txt', 'license.txt': 'txt',
+        'licence': 'txt', 'licence.txt': 'txt',
+        'copying': 'txt',
+    }
+    # Smaller files are left to Magika, which labels them from their bytes without the model anyway
+    FAST_PATH_MIN_SIZE = 64
+    FAST_PATH_HEAD = max(map(len, FAST_PATH_MAGIC))
+
     @classmethod
     def get_magika(cls) -> Magika:
         """Lazy initialization of Magika instance (singleton pattern)"""
@@ -22,6 +54,37 @@ class FileTypeDetector:
             cls._magika_instance = Magika()
         return cls._magika_instance
     
+    @classmethod
+    def fingerprint(cls) -> str:
+        """Identify the Magika model and the fast path signatures, used to key cached file types.
+        Independent of the analyzer fingerprint: a pattern change does not force the types to be detected again"""
+        parts = [
+            getattr(magika_package, '__version__', 'unknown'),
+            getattr(magika_package.magika, '_DEFAULT_MODEL_NAME', 'unknown'),
+            str(cls.FAST_PATH_MIN_SIZE),
+        ]
+        parts.extend(f"{magic.hex()}/{label}" for magic, label in cls.FAST_PATH_MAGIC.items())
+        return hashlib.sha256("\n".join(parts).encode("utf8")).hexdigest()[:16]
+
+    @classmethod
+    def is_cacheable(cls, file_name: str, fast_path: str = 'magic') -> bool:
+        """Whether the label of a file depends only on its content. Not the case of the names of the 'all' fast path"""
+        return fast_path != 'all' or PurePath(file_name).name.lower() not in cls.FAST_PATH_NAMES
+
+    @classmethod
+    def cached_type(cls, digest: str) -> Optional[str]:
+        label = cls._type_cache.get(digest)
+        if label is not None:
+            cls._type_cache.move_to_end(digest)
+        return label
+
+    @classmethod
+    def remember_type(cls, digest: str, label: str) -> None:
+        cls._type_cache[digest] = label
+        cls._type_cache.move_to_end(digest)
+        while len(cls._type_cache) > cls.TYPE_CACHE_SIZE:
+            cls._type_cache.popitem(last=False)
+
     @classmethod
     def detect_file_type(cls, file_path: Path) -> str:
         """Detect file type using Magika. Returns the detected file type label (e.g., 'javascript', 'zip', 'png')"""
@@ -33,6 +96,134 @@ class FileTypeDetector:
             print(f"Error detecting file type for {file_path}: {e}")
             return 'unknown'
     
+    @classmethod
+    def detect_bytes_type(cls, content: bytes) -> str:
+        """Detect file type of in-memory content using Magika"""
+        try:
+            magika = cls.get_magika()
+            result = magika.identify_bytes(content)
+            return result.output.label
+        except Exception as e:
+            print(f"Error detecting file type for in-memory content: {e}")
+            return 'unknown'
+    
+    @classmethod
+    def fast_path_label(cls, head: bytes, size: int, file_name: str, level: str = 'magic') -> Optional[str]:
+        """Label of an unambiguous file from its first bytes, size and name, None if the model is needed"""
+        if level == 'off':
+            return None
+        if size == 0:
+            return 'empty'
+        if size < cls.FAST_PATH_MIN_SIZE:
+            return None
+        for magic, label in cls.FAST_PATH_MAGIC.items():
+            if head.startswith(magic):
+                return label
+        if level == 'all':
+            return cls.FAST_PATH_NAMES.get(file_name.lower())
+        return None
+
+    @classmethod
+    def detect_file_types(cls, sources: Sequence[Union[Path, bytes]], file_names: Sequence[str],
+                          fast_path: str = 'magic', batch_size: int = 1,
+                          digests: Optional[Sequence[Optional[str]]] = None) -> List[str]:
+        """Detect the types of a batch of files (paths or in-memory contents).
+        Contents identified before (by content hash) are not identified again,
+        files that need the model are identified batch_size at a time, with one model run per call"""
+        labels: List[Optional[str]] = [None] * len(sources)
+        digests = digests or [None] * len(sources)
+        cacheable = [digest is not None and cls.is_cacheable(file_name, fast_path) for digest, file_name in zip(digests, file_names)]
+        paths, contents = [], []    # (index, source) left to Magika
+        for i, (source, file_name) in enumerate(zip(sources, file_names)):
+            is_bytes = isinstance(source, (bytes, bytearray))
+            if cacheable[i]:
+                labels[i] = cls.cached_type(digests[i])
+                if labels[i] is not None:
+                    continue
+            if fast_path != 'off':
+                try:
+                    if is_bytes:
+                        labels[i] = cls.fast_path_label(bytes(source[:cls.FAST_PATH_HEAD]), len(source), PurePath(file_name).name, fast_path)
+                    else:
+                        labels[i] = cls._fast_path_label_of_path(source, file_name, fast_path)
+                except OSError:
+                    pass    # Left to Magika, which reports the error
+            if labels[i] is None:
+                (contents if is_bytes else paths).append((i, source))
+
+        batch_size = max(1, batch_size)
+        for pending, identify in ((paths, cls._identify_paths), (contents, cls._identify_contents)):
+            for start in range(0, len(pending), batch_size):
+                batch = pending[start:start + batch_size]
+                for (i, _), label in zip(batch, identify([source for _, source in batch])):
+                    labels[i] = label
+
+        for i, label in enumerate(labels):
+            if cacheable[i]:
+                cls.remember_type(digests[i], label)
+        return labels
+
+    @classmethod
+    def _fast_path_label_of_path(cls, file_path: Path, file_name: str, level: str) -> Optional[str]:
+        size = file_path.stat().st_size
+        head = b''
+        if size >= cls.FAST_PATH_MIN_SIZE:
+            with open(file_path, 'rb') as f:
+                head = f.read(cls.FAST_PATH_HEAD)
+        return cls.fast_path_label(head, size, PurePath(file_name).name, level)
+
+    @classmethod
+    def _identify_paths(cls, paths: List[Path]) -> List[str]:
+        try:
+            results = cls.get_magika().identify_paths(paths)
+        except Exception as e:
+            print(f"Error detecting file types of a batch of {len(paths)} files: {e}")
+            return [cls.detect_file_type(path) for path in paths]
+        labels = []
+        for path, result in zip(paths, results):
+            if result.ok:
+                labels.append(result.output.label)
+            else:
+                print(f"Error detecting file type for {path}: {result.status}")
+                labels.append('unknown')
+        return labels
+
+    @classmethod
+    def has_batch_api(cls) -> bool:
+        """Magika has no public batch API for in-memory content, the private one of the version pinned in
+        requirements.txt is used. Another version may not have it, contents are then identified one at a time"""
+        if cls._batch_api is None:
+            try:
+                from magika.types import Seekable  # noqa: F401
+                magika = cls.get_magika()
+                cls._batch_api = all(hasattr(magika, name) for name in ('_get_result_or_features_from_seekable', '_get_results_from_features'))
+            except ImportError:
+                cls._batch_api = False
+        return cls._batch_api
+
+    @classmethod
+    def _identify_contents(cls, contents: List[bytes]) -> List[str]:
+        """Features are collected per content and the model is run once on all of them, as identify_paths does for files"""
+        if len(contents) == 1 or not cls.has_batch_api():
+            return [cls.detect_bytes_type(bytes(content)) for content in contents]
+        try:
+            from magika.types import Seekable
+            magika = cls.get_magika()
+            labels: List[Optional[str]] = [None] * len(contents)
+            features = []
+            for i, content in enumerate(contents):
+                result, file_features = magika._get_result_or_features_from_seekable(Seekable(io.BytesIO(bytes(content))), Path(str(i)))
+                if result is not None:
+                    labels[i] = result.output.label
+                else:
+                    features.append((Path(str(i)), file_features))
+            for key, result in magika._get_results_from_features(features).items():
+                labels[int(key)] = result.output.label
+            return labels
+        except Exception as e:
+            print(f"Error detecting file types of a batch of {len(contents)} in-memory contents: {e}")
+            return [cls.detect_bytes_type(bytes(content)) for content in contents]
+
     @classmethod
     def is_valid_file_for_analysis(cls, file_type: str) -> bool:
         """Check if the detected file type should be treated as text"""
@@ -0,0 +1,212 @@
+import pickle
+import sqlite3
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from models.composed_metrics import FileMetrics, VersionMetrics
+from .logging_utils import synchronized_print
+
+class MetricsStore:
+    """Persistent SQLite store of analysis results that survives between runs.
+    File results are keyed by content hash, version results by tarball hash, both scoped by the analyzer fingerprint.
+    File types are keyed by content hash too, but scoped by the file type fingerprint (Magika model), so they survive pattern changes.
+    The store is bounded in size: the least recently used entries are evicted first.
+    Several package processes may share the store: every write is a short transaction of its own, and the access times
+    of the entries read are kept in memory until commit(), so no transaction stays open while files are analyzed."""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS file_metrics (
+            fingerprint TEXT NOT NULL,
+            digest TEXT NOT NULL,
+            file_name TEXT NOT NULL,
+            payload BLOB NOT NULL,
+            size INTEGER NOT NULL,
+            last_access REAL NOT NULL,
+            PRIMARY KEY (fingerprint, digest, file_name)
+        );
+        CREATE TABLE IF NOT EXISTS version_metrics (
+            fingerprint TEXT NOT NULL,
+            digest TEXT NOT NULL,
+            payload BLOB NOT NULL,
+            size INTEGER NOT NULL,
+            last_access REAL NOT NULL,
+            PRIMARY KEY (fingerprint, digest)
+        );
+        CREATE TABLE IF NOT EXISTS file_types (
+            fingerprint TEXT NOT NULL,
+            digest TEXT NOT NULL,
+            label TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            last_access REAL NOT NULL,
+            PRIMARY KEY (fingerprint, digest)
+        );
+        CREATE INDEX IF NOT EXISTS file_metrics_access ON file_metrics (last_access);
+        CREATE INDEX IF NOT EXISTS version_metrics_access ON version_metrics (last_access);
+        CREATE INDEX IF NOT EXISTS file_types_access ON file_types (last_access);
+    """
+    TABLES = ("file_metrics", "version_metrics", "file_types")
+
+    # Approximate size of a file type row (key and label), counted against the size bound
+    FILE_TYPE_ROW_SIZE = 96
+
+    # Key columns of each table after the fingerprint, used to update the access times
+    KEYS = {"file_metrics": ("digest", "file_name"), "version_metrics": ("digest",), "file_types": ("digest",)}
+
+    def __init__(self, path: str, fingerprint: str, max_mb: int = 1024, type_fingerprint: Optional[str] = None):
+        self.path = Path(path)
+        self.fingerprint = fingerprint
+        self.type_fingerprint = type_fingerprint or fingerprint
+        self.max_bytes = max_mb * 1024 * 1024
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # Several package processes may share the same store, WAL lets readers and one writer work together.
+        # Autocommit mode: sqlite3 would otherwise open a transaction on the first write and hold the write lock until commit()
+        self._conn = sqlite3.connect(str(self.path), timeout=60, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # A crash of the process cannot corrupt the store in WAL mode, only a power loss can drop the last writes
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(self.SCHEMA)
+        # Access times of the entries read since the last commit: table -> key -> time
+        self._accessed: Dict[str, Dict[Tuple[str, ...], float]] = {table: {} for table in self.TABLES}
+
+    def close(self) -> None:
+        if self._conn is not None:
+            self._flush_access_times()
+            self._conn.close()
+            self._conn = None
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        """Short write transaction, the write lock is taken at once so concurrent writers wait on busy timeout"""
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield self._conn
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+        self._conn.execute("COMMIT")
+
+    def get_file(self, digest: str, file_name: str) -> Optional[FileMetrics]:
+        row = self._conn.execute(
+            "SELECT payload FROM file_metrics WHERE fingerprint = ? AND digest = ? AND file_name = ?",
+            (self.fingerprint, digest, file_name),
+        ).fetchone()
+        if row is None:
+            return None
+        self._accessed["file_metrics"][(digest, file_name)] = time.time()
+        return pickle.loads(row[0])
+
+    def put_file(self, digest: str, file_name: str, metrics: FileMetrics) -> None:
+        payload = pickle.dumps(metrics, protocol=pickle.HIGHEST_PROTOCOL)
+        with self._transaction() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO file_metrics VALUES (?, ?, ?, ?, ?, ?)",
+                (self.fingerprint, digest, file_name, payload, len(payload), time.time()),
+            )
+
+    def get_version(self, digest: str) -> Optional[Tuple[List[FileMetrics], VersionMetrics]]:
+        row = self._conn.execute(
+            "SELECT payload FROM version_metrics WHERE fingerprint = ? AND digest = ?",
+            (self.fingerprint, digest),
+        ).fetchone()
+        if row is None:
+            return None
+        self._accessed["version_metrics"][(digest,)] = time.time()
+        return pickle.loads(row[0])
+
+    def put_version(self, digest: str, file_metrics: List[FileMetrics], version_metrics: VersionMetrics) -> None:
+        payload = pickle.dumps((file_metrics, version_metrics), protocol=pickle.HIGHEST_PROTOCOL)
+        with self._transaction() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO version_metrics VALUES (?, ?, ?, ?, ?)",
+                (self.fingerprint, digest, payload, len(payload), time.time()),
+            )
+
+    def get_file_types(self, digests: Iterable[str]) -> Dict[str, str]:
+        """Labels of the contents that were already identified, by content hash"""
+        digests = list(dict.fromkeys(digests))
+        labels = {}
+        # Bounded number of parameters per query
+        for start in range(0, len(digests), 500):
+            chunk = digests[start:start + 500]
+            marks = ",".join("?" * len(chunk))
+            labels.update(self._conn.execute(
+                f"SELECT digest, label FROM file_types WHERE fingerprint = ? AND digest IN ({marks})",
+                (self.type_fingerprint, *chunk),
+            ).fetchall())
+        now = time.time()
+        for digest in labels:
+            self._accessed["file_types"][(digest,)] = now
+        return labels
+
+    def put_file_types(self, labels: Dict[str, str]) -> None:
+        now = time.time()
+        with self._transaction() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO file_types VALUES (?, ?, ?, ?, ?)",
+                [(self.type_fingerprint, digest, label, self.FILE_TYPE_ROW_SIZE, now) for digest, label in labels.items()],
+            )
+
+    def commit(self) -> None:
+        """Write the access times of the entries read, then evict old entries if the store is over its size bound
+        (the entries themselves are written at once)"""
+        self._flush_access_times()
+        self._evict()
+
+    def _flush_access_times(self) -> None:
+        if not any(self._accessed.values()):
+            return
+        with self._transaction() as conn:
+            for table, accessed in self._accessed.items():
+                fingerprint = self.type_fingerprint if table == "file_types" else self.fingerprint
+                where = " AND ".join(f"{column} = ?" for column in self.KEYS[table])
+                conn.executemany(
+                    f"UPDATE {table} SET last_access = ? WHERE fingerprint = ? AND {where}",
+                    [(when, fingerprint, *key) for key, when in accessed.items()],
+                )
+        self._accessed = {table: {} for table in self.TABLES}
+
+    def size_bytes(self) -> int:
+        return sum(
+            self._conn.execute(f"SELECT COALESCE(SUM(size), 0) FROM {table}").fetchone()[0]
+            for table in self.TABLES
+        )
+
+    def _evict(self) -> None:
+        """LRU eviction down to 90% of the size bound"""
+        excess = self.size_bytes() - self.max_bytes
+        if excess <= 0:
+            return
+        excess += self.max_bytes // 10
+        rows = self._conn.execute(
+            "SELECT 'file_metrics', rowid, size, last_access FROM file_metrics "
+            "UNION ALL SELECT 'version_metrics', rowid, size, last_access FROM version_metrics "
+            "UNION ALL SELECT 'file_types', rowid, size, last_access FROM file_types "
+            "ORDER BY last_access"
+        )
+        to_delete = []
+        for table, rowid, size, _ in rows:
+            if excess <= 0:
+                break
+            to_delete.append((table, rowid))
+            excess -= size
+        rows.close()
+        with self._transaction() as conn:
+            for table in self.TABLES:
+                conn.executemany(f"DELETE FROM {table} WHERE rowid = ?", [(r,) for t, r in to_delete if t == table])
+
+    def invalidate(self, all_entries: bool = False) -> int:
+        """Delete the entries produced by other analyzer fingerprints (e.g. after a pattern change), or all of them.
+        File types are kept unless they were produced by another Magika model"""
+        deleted = 0
+        with self._transaction() as conn:
+            for table in self.TABLES:
+                fingerprint = self.type_fingerprint if table == "file_types" else self.fingerprint
+                if all_entries:
+                    cursor = conn.execute(f"DELETE FROM {table}")
+                else:
+                    cursor = conn.execute(f"DELETE FROM {table} WHERE fingerprint != ?", (fingerprint,))
+                deleted += cursor.rowcount
+        self._conn.execute("VACUUM")
+        synchronized_print(f"Metrics store {self.path}: {deleted} entries invalidated")
+        return deleted
@@ -1,59 +1,119 @@
+import json
+import os
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Dict, Optional
+from typing import BinaryIO, Dict, Iterator, Optional, Tuple
 import requests
 from .logging_utils import synchronized_print
+from .tarball_downloader import TarballDownloader
+from .packument_parser import PackumentParser
 from models import VersionEntry, SourceType
 from packaging.version import parse as parse_version
-from packaging.version import InvalidVersion, Version
+from packaging.version import InvalidVersion
 class NPMClient:
-    def __init__(self, registry_url: str = "https://registry.npmjs.org", pkg_name: str = ""):
+    # Abbreviated install metadata: only what npm install needs (versions, dist, dependencies), no readme/maintainers/time
+    ABBREVIATED_ACCEPT = "application/vnd.npm.install-v1+json; q=1.0, application/json; q=0.8, */*"
+
+    def __init__(self, registry_url: str = "https://registry.npmjs.org", pkg_name: str = "", downloader: Optional[TarballDownloader] = None,
+                 metadata_cache_dir: Optional[Path] = None, metadata_timeout: float = 30, abbreviated: bool = True):
         self.pkg_name = pkg_name
-        self.registry_url = registry_url
+        self.registry_url = registry_url.rstrip('/')
+        self.downloader = downloader or TarballDownloader()
+        self.metadata_cache_dir = Path(metadata_cache_dir) if metadata_cache_dir else None
+        self.metadata_timeout = metadata_timeout
+        self.abbreviated = abbreviated
     
-    def get_npm_package_data(self) -> Optional[Dict]:
-        """Fetch raw metadata for an NPM package by making an HTTP request to the registry"""
+    def get_last_valid_versions_data(self, keep: int = 20) -> Optional[Tuple[int, list[Tuple[str, Dict]]]]:
+        """Stream the registry document and keep only the dist entries of the last `keep` valid versions.
+        Returns (number of versions, [(version, dist)]), see PackumentParser.parse"""
         try:
-            response = requests.get(f'{self.registry_url}/{self.pkg_name}', timeout=5)
-            response.raise_for_status()
-            return response.json()
-        
+            with self._open_metadata() as body:
+                return PackumentParser(keep=keep).parse(body)
+
         except requests.exceptions.RequestException as e:
             print(f"Failed to fetch '{self.pkg_name}': {e}")
             return None
-        
-    def get_last_20_valid_versions(self, data: dict) -> list[str]:
-        parsed_versions = []
+        except Exception as e:
+            print(f"Failed to read metadata of '{self.pkg_name}': {e}")
+            return None
 
-        for v in data["versions"].keys():
-            try:
-                parsed_versions.append((Version(v), v))  # (parsed, original)
-            except InvalidVersion:
-                continue
+    def _metadata_cache_paths(self) -> Tuple[Path, Path]:
+        """Cached body and its validators (ETag, Last-Modified)"""
+        kind = "abbreviated" if self.abbreviated else "full"
+        base = self.metadata_cache_dir / f"{self.pkg_name.replace('/', '_')}.{kind}"
+        return Path(f"{base}.json"), Path(f"{base}.meta.json")
+
+    @contextmanager
+    def _open_metadata(self) -> Iterator[BinaryIO]:
+        """Open the registry document as a binary stream. With a cache directory, the cached copy is revalidated
+        with a conditional request, so an unchanged package costs a single 304 response"""
+        url = f'{self.registry_url}/{self.pkg_name}'
+        headers = {'Accept': self.ABBREVIATED_ACCEPT} if self.abbreviated else {}
+        session = TarballDownloader.get_session()
 
-        if len(parsed_versions) < 20:   #19
-            return []
+        if self.metadata_cache_dir is None:
+            with session.get(url, headers=headers, timeout=self.metadata_timeout, stream=True) as response:
+                response.raise_for_status()
+                response.raw.decode_content = True
+                yield response.raw
+            return
+
+        body_path, meta_path = self._metadata_cache_paths()
+        if body_path.exists() and meta_path.exists():
+            validators = json.loads(meta_path.read_text(encoding='utf-8'))
+            if validators.get('etag'):
+                headers['If-None-Match'] = validators['etag']
+            if validators.get('last_modified'):
+                headers['If-Modified-Since'] = validators['last_modified']
+
+        try:
+            with session.get(url, headers=headers, timeout=self.metadata_timeout, stream=True) as response:
+                if response.status_code != 304 or not body_path.exists():
+                    response.raise_for_status()
+                    self._store_metadata(response, body_path, meta_path)
+        except requests.exceptions.RequestException as e:
+            if not body_path.exists():
+                raise
+            synchronized_print(f"Failed to revalidate metadata of '{self.pkg_name}', using cached copy: {e}")
+
+        with open(body_path, 'rb') as f:
+            yield f
 
-        parsed_versions.sort(key=lambda x: x[0])
-        return [orig for _, orig in parsed_versions[-20:]]  #19
+    def _store_metadata(self, response: requests.Response, body_path: Path, meta_path: Path) -> None:
+        """Stream the body to the cache and record its validators, replacing the previous copy atomically"""
+        body_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = Path(f"{body_path}.part")
+        with open(tmp_path, 'wb') as f:
+            for chunk in response.iter_content(chunk_size=64 * 1024):
+                f.write(chunk)
+        os.replace(tmp_path, body_path)
+        validators = {
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+        }
+        meta_path.write_text(json.dumps(validators), encoding='utf-8')
         
-    def download_package_versions_tarball(self, download_dir: Path = Path("tarballs")) -> list[VersionEntry]:
-        """Download the tarball for 20 lastest versions of the package from NPM registry"""
-        data = self.get_npm_package_data()
-        if not data or 'versions' not in data:
+    def download_package_versions_tarball(self, download_dir: Path = Path("tarballs"), extract: bool = True) -> list[VersionEntry]:
+        """Download the tarball for 20 lastest versions of the package from NPM registry.
+        With extract=False the entries point to the tarballs themselves, to be analyzed in memory"""
+        data = self.get_last_valid_versions_data(20)
+        if not data:
             synchronized_print(f"No version data found for {self.pkg_name}")
             return None
+        num_versions, versions_data = data
         
-        if len(data['versions']) == 0:
+        if num_versions == 0:
             synchronized_print(f"No versions found for {self.pkg_name}")
             return None
         
-        if len(data['versions']) < 20:
-            synchronized_print(f"Not enough versions for analysis, for {self.pkg_name}, found only {len(data['versions'])} versions. Skipping package.")
+        if num_versions < 20:
+            synchronized_print(f"Not enough versions for analysis, for {self.pkg_name}, found only {num_versions} versions. Skipping package.")
             return None
         
-        if len(data['versions']) >= 20:
-            synchronized_print(f"Found {len(data['versions'])} versions for {self.pkg_name}, but i consider only the last 20")
-        versions = self.get_last_20_valid_versions(data)
+        if num_versions >= 20:
+            synchronized_print(f"Found {num_versions} versions for {self.pkg_name}, but i consider only the last 20")
+        versions = [version for version, _ in versions_data]
+        dists = dict(versions_data)
 
         if not versions:
             synchronized_print(f"Not enough valid semantic versions for {self.pkg_name}. Skipping package.")
@@ -63,32 +123,36 @@ class NPMClient:
         pkg_dir.mkdir(parents=True, exist_ok=True)
         #synchronized_print(f"Downloading tarballs for {self.pkg_name} {len(versions)} versions...")
 
+        jobs = []
         for version in versions:
-            version_data = data['versions'][version]
-            tarball_url = version_data.get('dist', {}).get('tarball', '')
+            dist = dists[version] or {}
+            tarball_url = dist.get('tarball', '')
             if not tarball_url:
                 synchronized_print(f"No tarball URL for version {version} of {self.pkg_name}")
                 continue
 
             tarball_path = pkg_dir / f"{version}.tgz"
+            expected = TarballDownloader.expected_digest(dist)
             if tarball_path.exists():
-                #synchronized_print(f"Tarball already downloaded for {self.pkg_name} version {version}")
-                continue
-            
-            try:
-                #synchronized_print(f"Downloading tarball for {self.pkg_name} version {version}...")
-                response = requests.get(tarball_url, timeout=10)
-                response.raise_for_status()
-                
-                with open(tarball_path, 'wb') as f:
-                    f.write(response.content)
-                
-                #synchronized_print(f"Downloaded tarball for {self.pkg_name} version {version}")
+                # A tarball left by a previous run is trusted only if it matches the registry digest
+                if expected is None or TarballDownloader.file_matches(tarball_path, expected):
+                    #synchronized_print(f"Tarball already downloaded for {self.pkg_name} version {version}")
+                    continue
+                synchronized_print(f"Corrupted tarball for {self.pkg_name} version {version}, downloading it again")
+                tarball_path.unlink()
+            jobs.append((tarball_url, tarball_path, expected))
 
-            except Exception as e:
-                synchronized_print(f"Error downloading tarball for {self.pkg_name} version {version}: {e}")
+        errors = self.downloader.download_all(jobs)
+        for tarball_path, error in errors.items():
+            if error is not None:
+                synchronized_print(f"Error downloading tarball for {self.pkg_name} version {tarball_path.stem}: {error}")
 
         synchronized_print(f"Finished downloading tarballs for {self.pkg_name}")        
+        if not extract:
+            return [
+                VersionEntry(name=version, source=SourceType.TARBALL, ref=pkg_dir / f"{version}.tgz", tarball=pkg_dir / f"{version}.tgz")
+                for version in versions if (pkg_dir / f"{version}.tgz").exists()
+            ]
         extract_dir = download_dir / self.pkg_name.replace('/', '_') / "extracted" 
         extract_dir.mkdir(parents=True, exist_ok=True)
         entries = []
@@ -113,7 +177,7 @@ class NPMClient:
             with tarfile.open(tarball_path, 'r:gz') as tar:
                 tar.extractall(path=extract_path)
             #synchronized_print(f"Extracted {tarball_path} to {extract_path}")
-            return VersionEntry(name=tarball_path.stem, source=SourceType.TARBALL, ref=extract_path)
+            return VersionEntry(name=tarball_path.stem, source=SourceType.TARBALL, ref=extract_path, tarball=tarball_path)
         except Exception as e:
             print(f"Error extracting {tarball_path}: {e}")
             return None
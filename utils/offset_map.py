@@ -0,0 +1,41 @@
+from array import array
+from bisect import bisect_right
+from typing import Optional, Tuple, Union
+
+class OffsetMap:
+    """Maps character positions of the content without comments back to the original content (byte positions for bytes).
+    The stripped content is a sequence of kept segments of the original: only the start of each segment is stored
+    (stripped start, original start), a position is mapped with a binary search."""
+
+    def __init__(self, original: Union[str, bytes], stripped_starts: array, original_starts: array):
+        self.original = original
+        self._stripped_starts = stripped_starts
+        self._original_starts = original_starts
+        self._line_starts: Optional[array] = None
+
+    @classmethod
+    def identity(cls, original: Union[str, bytes]) -> "OffsetMap":
+        """Map of a content from which nothing was removed"""
+        return cls(original, array('q', [0]), array('q', [0]))
+
+    def __len__(self) -> int:
+        return len(self._stripped_starts)
+
+    def to_original(self, pos: int) -> int:
+        """Position in the original content of the character at `pos` in the stripped content"""
+        i = bisect_right(self._stripped_starts, pos) - 1
+        return self._original_starts[i] + pos - self._stripped_starts[i]
+
+    def line_column(self, pos: int) -> Tuple[int, int]:
+        """Original line and column (both 1-based) of the character at `pos` in the stripped content"""
+        if self._line_starts is None:
+            line_starts = array('q', [0])
+            newline = "\n" if isinstance(self.original, str) else b"\n"
+            i = self.original.find(newline)
+            while i != -1:
+                line_starts.append(i + 1)
+                i = self.original.find(newline, i + 1)
+            self._line_starts = line_starts
+        original_pos = self.to_original(pos)
+        line = bisect_right(self._line_starts, original_pos)
+        return line, original_pos - self._line_starts[line - 1] + 1
@@ -0,0 +1,82 @@
+import heapq
+import json
+from typing import BinaryIO, Dict, Iterator, List, Optional, Tuple
+from packaging.version import InvalidVersion, Version
+
+try:
+    import ijson
+except ImportError:     # Optional: without it the whole document is loaded in memory
+    ijson = None
+
+class PackumentParser:
+    """Incremental parse of a registry document (full packument or abbreviated metadata).
+    Only the version keys and the dist entries of the last N valid versions are kept, everything else is discarded
+    while reading, so memory does not depend on how long the history of the package is."""
+
+    def __init__(self, keep: int = 20):
+        self.keep = keep
+
+    def parse(self, stream: BinaryIO) -> Optional[Tuple[int, List[Tuple[str, Dict]]]]:
+        """Returns (number of versions, [(version, dist)] of the last `keep` valid versions in ascending order),
+        or None if the document has no versions. The list is empty if there are fewer than `keep` valid versions."""
+        items = self._iter_ijson(stream) if ijson is not None else self._iter_json(stream)
+        heap = []   # min-heap of (parsed version, arrival order, version, dist), bounded to `keep` items
+        total = 0
+        seen_versions = False
+        for key, dist in items:
+            if key is None:
+                seen_versions = True
+                continue
+            total += 1
+            try:
+                item = (Version(key), total, key, dist)
+            except InvalidVersion:
+                continue
+            # On equal versions the later one wins, as with a stable sort of the whole list
+            if len(heap) < self.keep:
+                heapq.heappush(heap, item)
+            elif item[:2] > heap[0][:2]:
+                heapq.heapreplace(heap, item)
+
+        if not seen_versions:
+            return None
+        if len(heap) < self.keep:
+            return total, []
+        return total, [(key, dist) for _, _, key, dist in sorted(heap, key=lambda x: x[:2])]
+
+    @staticmethod
+    def _iter_ijson(stream: BinaryIO) -> Iterator[Tuple[Optional[str], Dict]]:
+        """Yield (None, {}) when the versions object starts, then (version, dist) for every version"""
+        events = ijson.parse(stream)
+        key = None
+        dist_prefix = None
+        for prefix, event, value in events:
+            if prefix == "versions":
+                if event == "start_map":
+                    yield None, {}
+                elif event == "map_key":
+                    if key is not None:
+                        yield key, {}
+                    key = value
+                    dist_prefix = f"versions.{key}.dist"
+                elif event == "end_map" and key is not None:
+                    yield key, {}
+                    key = None
+            elif key is not None and prefix == dist_prefix and event == "start_map":
+                builder = ijson.ObjectBuilder()
+                builder.event(event, value)
+                for prefix, event, value in events:
+                    builder.event(event, value)
+                    if prefix == dist_prefix and event == "end_map":
+                        break
+                yield key, builder.value
+                key = None
+
+    @staticmethod
+    def _iter_json(stream: BinaryIO) -> Iterator[Tuple[Optional[str], Dict]]:
+        data = json.load(stream)
+        if not isinstance(data, dict) or 'versions' not in data:
+            return
+        yield None, {}
+        for key, manifest in data['versions'].items():
+            yield key, (manifest or {}).get('dist', {})
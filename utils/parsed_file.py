@@ -0,0 +1,50 @@
+import threading
+from typing import Optional, Union
+from tree_sitter import Language, Parser, Tree
+import tree_sitter_typescript as tstypescript
+
+class ParsedFile:
+    """Content of a JS/TS file together with its syntax tree.
+    The file is parsed lazily and at most once, so comment removal and any AST based analysis share the same tree.
+    The content is text or bytes (also a memory mapped file, which is parsed without copying it: the offset map
+    then refers to the mapping and is valid only until the file is unmapped)."""
+
+    JS_LANGUAGE = Language(tstypescript.language_typescript())
+
+    # Parsers are reused for every file, one per thread since a parser cannot be shared while parsing
+    _local = threading.local()
+
+    def __init__(self, content: Union[str, bytes], file_name: str):
+        self.content = content
+        self.file_name = file_name
+        self._content_bytes: Optional[bytes] = None
+        self._tree: Optional[Tree] = None
+        self._parsed = False
+        # Map from the content without comments back to this one, set when the comments are stripped
+        self.offset_map = None
+
+    @classmethod
+    def get_parser(cls) -> Parser:
+        """Lazy initialization of the parser of the current thread (and process)"""
+        parser = getattr(cls._local, "parser", None)
+        if parser is None:
+            parser = Parser(cls.JS_LANGUAGE)
+            cls._local.parser = parser
+        return parser
+
+    @property
+    def content_bytes(self) -> bytes:
+        if self._content_bytes is None:
+            self._content_bytes = self.content.encode("utf8") if isinstance(self.content, str) else self.content
+        return self._content_bytes
+
+    @property
+    def tree(self) -> Optional[Tree]:
+        """Syntax tree of the content, None if the parser failed"""
+        if not self._parsed:
+            self._parsed = True
+            try:
+                self._tree = self.get_parser().parse(self.content_bytes)
+            except Exception:
+                self._tree = None
+        return self._tree
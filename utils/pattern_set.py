@@ -0,0 +1,210 @@
+import re
+import time
+from typing import Any, Dict, FrozenSet, List, Optional, Pattern, Tuple, Union
+from .utils_for_analyzer import UtilsForAnalyzer
+from .string_table import StringTable
+
+try:
+    import re._parser as sre_parse
+    import re._constants as sre_constants
+except ImportError:     # Python < 3.11
+    import sre_parse
+    import sre_constants
+
+class PatternSet:
+    """Patterns of every category compiled once and scanned together, with the matches routed to the owning group.
+    Every pattern is anchored on the literals it requires (extracted from the parsed expression): a pattern whose
+    literals are not in the content cannot match and costs only a substring search, so the scan time follows the
+    patterns that can match, not the number of patterns. Matches are exactly those of each pattern's own finditer.
+    Bytes content is scanned with a bytes twin of each pattern, without decoding it: only for content on which the
+    twin matches the same as the text pattern (see UtilsForAnalyzer.is_byte_exact)."""
+
+    # Non ASCII characters that match ASCII letters under re.IGNORECASE (İ, ı, ſ, Kelvin sign)
+    CASE_FOLD = str.maketrans({'İ': 'i', 'ı': 'i', 'ſ': 's', 'K': 'k'})
+
+    # Seconds of matching per scanned content, shared by all the patterns (see UtilsForAnalyzer.detect_patterns_with_timeout)
+    TIME_BUDGET = 5
+
+    def __init__(self, groups: Dict[str, List[Pattern]], max_matches: Optional[int] = None):
+        self.groups = groups
+        self.max_matches = max_matches     # Per pattern and file, None for no cap
+        self._patterns: List[Pattern] = []
+        self._owners: List[str] = []
+        for name, patterns in groups.items():
+            for pattern in patterns:
+                self._patterns.append(pattern)
+                self._owners.append(name)
+        # Literals of which at least one must appear in the content for the pattern to match, None if unknown
+        self._literals = [self._required_literals(p) for p in self._patterns]
+        # Same literals and patterns for bytes content
+        self._byte_literals = [self._encode_literals(required) for required in self._literals]
+        self._byte_patterns = [self._byte_twin(p) for p in self._patterns]
+
+    @staticmethod
+    def _byte_twin(pattern: Pattern) -> Optional[Pattern]:
+        """The pattern compiled for bytes, None if it cannot be (e.g. non ASCII or \\u escapes)"""
+        if not isinstance(pattern.pattern, str):
+            return pattern
+        try:
+            return re.compile(pattern.pattern.encode("ascii"), pattern.flags & ~(re.UNICODE | re.ASCII))
+        except (UnicodeEncodeError, re.error):
+            return None
+
+    @staticmethod
+    def _encode_literals(required: Optional[Tuple[bool, FrozenSet[str]]]) -> Optional[Tuple[bool, FrozenSet[bytes]]]:
+        # Non ASCII literals cannot appear in ASCII content, they are left out
+        if required is None:
+            return None
+        ignore_case, literals = required
+        return ignore_case, frozenset(literal.encode("ascii") for literal in literals if literal.isascii())
+
+    @classmethod
+    def _required_literals(cls, pattern: Pattern) -> Optional[Tuple[bool, FrozenSet[str]]]:
+        """(case insensitive, literals)"""
+        if not isinstance(pattern.pattern, str):
+            return None
+        try:
+            parsed = sre_parse.parse(pattern.pattern, pattern.flags)
+        except Exception:
+            return None
+        literals = cls._literals_of(parsed)
+        if literals is None:
+            return None
+        ignore_case = bool(pattern.flags & re.IGNORECASE)
+        if ignore_case:
+            if not all(literal.isascii() for literal in literals):
+                return None
+            literals = frozenset(literal.lower() for literal in literals)
+        return ignore_case, literals
+
+    @classmethod
+    def _literals_of(cls, items) -> Optional[FrozenSet[str]]:
+        """Most selective set of literals one of which is part of every match of the sequence"""
+        best = None
+        run = []
+
+        def consider(literals: Optional[FrozenSet[str]]) -> None:
+            nonlocal best
+            if literals and (best is None or min(map(len, literals)) > min(map(len, best))):
+                best = literals
+
+        for op, av in items:
+            if op is sre_constants.LITERAL:
+                run.append(chr(av))
+                continue
+            if run:
+                consider(frozenset(["".join(run)]))
+                run = []
+            if op is sre_constants.SUBPATTERN:
+                _, add_flags, del_flags, sub = av
+                # Scoped flags (e.g. (?i:...)) change how the literals match
+                if not add_flags and not del_flags:
+                    consider(cls._literals_of(sub))
+            elif op in (sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT, getattr(sre_constants, 'POSSESSIVE_REPEAT', None)):
+                low, _, sub = av
+                if low >= 1:
+                    consider(cls._literals_of(sub))
+            elif op is getattr(sre_constants, 'ATOMIC_GROUP', None):
+                consider(cls._literals_of(av))
+            elif op is sre_constants.BRANCH:
+                branches = [cls._literals_of(branch) for branch in av[1]]
+                if all(branches):
+                    consider(frozenset().union(*branches))
+        if run:
+            consider(frozenset(["".join(run)]))
+        return best
+
+    def _candidates(self, content: str) -> List[int]:
+        """Patterns whose required literals appear in the content"""
+        folded = None
+        candidates = []
+        for i, required in enumerate(self._literals):
+            if required is not None:
+                ignore_case, literals = required
+                if ignore_case:
+                    if folded is None:
+                        folded = content
+                        if not content.isascii() and any(chr(c) in content for c in self.CASE_FOLD):
+                            folded = content.translate(self.CASE_FOLD)
+                        folded = folded.lower()
+                    haystack = folded
+                else:
+                    haystack = content
+                if not any(literal in haystack for literal in literals):
+                    continue
+            candidates.append(i)
+        return candidates
+
+    def _byte_candidates(self, content: bytes) -> List[int]:
+        """Same as _candidates, for ASCII bytes content"""
+        folded = None
+        candidates = []
+        for i, required in enumerate(self._byte_literals):
+            if required is not None:
+                ignore_case, literals = required
+                if ignore_case:
+                    if folded is None:
+                        folded = content.lower()
+                    haystack = folded
+                else:
+                    haystack = content
+                if not any(literal in haystack for literal in literals):
+                    continue
+            candidates.append(i)
+        return candidates
+
+    def scan(self, content: Union[str, bytes], collectors: Optional[Dict[str, Any]] = None) -> Dict[str, List[str]]:
+        """Matches of every group, in the same order as running each pattern of the group one after the other.
+        Bytes content must be byte exact (see UtilsForAnalyzer.is_byte_exact), only the matches are decoded.
+        The matches of the groups in collectors are appended to them as they are found instead (e.g. a MatchTally),
+        and they are returned in place of the list"""
+        if not isinstance(content, str):
+            return self._scan_bytes(content, collectors)
+        matches = self._collectors(collectors)
+        deadline = time.monotonic() + self.TIME_BUDGET
+        with UtilsForAnalyzer.regex_interrupt(deadline):
+            for i in self._candidates(content):
+                UtilsForAnalyzer.detect_patterns(content, [self._patterns[i]], deadline, self.max_matches, matches[self._owners[i]])
+        return self._deduplicate(matches)
+
+    def _collectors(self, collectors: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        matches = {name: [] for name in self.groups}
+        matches.update(collectors or {})
+        return matches
+
+    def _scan_bytes(self, content: bytes, collectors: Optional[Dict[str, Any]] = None) -> Dict[str, List[str]]:
+        matches = self._collectors(collectors)
+        deadline = time.monotonic() + self.TIME_BUDGET
+        text = None
+        with UtilsForAnalyzer.regex_interrupt(deadline):
+            for i in self._byte_candidates(content):
+                twin = self._byte_patterns[i]
+                if twin is None:
+                    # Decoding ASCII is cheap, and needed only if such a pattern can match
+                    if text is None:
+                        text = content.decode("ascii")
+                    UtilsForAnalyzer.detect_patterns(text, [self._patterns[i]], deadline, self.max_matches, matches[self._owners[i]])
+                else:
+                    UtilsForAnalyzer.detect_patterns(content, [twin], deadline, self.max_matches, _Decoded(matches[self._owners[i]]))
+        return self._deduplicate(matches)
+
+    @staticmethod
+    def _deduplicate(matches: Dict[str, List[str]]) -> Dict[str, List[str]]:
+        """Repeated matches share one string, which is also pickled once when the result leaves the worker"""
+        table = StringTable()
+        return {name: table.strings(found) if isinstance(found, list) else found for name, found in matches.items()}
+
+
+class _Decoded:
+    """Collector of the matches of a bytes pattern, decoded before they are appended to the target collector"""
+
+    __slots__ = ('target',)
+
+    def __init__(self, target: Any):
+        self.target = target
+
+    def __len__(self) -> int:
+        return len(self.target)
+
+    def append(self, match: bytes) -> None:
+        self.target.append(match.decode("ascii"))
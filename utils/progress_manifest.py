@@ -0,0 +1,94 @@
+import json
+import os
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, Set, Tuple
+
+class ProgressManifest:
+    """Completed work of a run, used to resume it after a crash.
+    One JSON line per finished version, with the size of each output file of the package once the rows of the version
+    were written, and one per finished package. A line is appended with a single write and synced after the output
+    files, so a crash leaves at most a torn last line, which is ignored. Packages running in other processes append
+    to the same file."""
+
+    FILE_NAME = "progress.jsonl"
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+
+    def reset(self) -> None:
+        """Start a new run"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.path.write_bytes(b"")
+
+    def repair(self) -> None:
+        """Terminate a torn last line, so the records of the resumed run start on a line of their own"""
+        if not self.path.exists():
+            return
+        with open(self.path, 'rb+') as f:
+            f.seek(0, os.SEEK_END)
+            if f.tell() == 0:
+                return
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b"\n":
+                f.write(b"\n")
+                f.flush()
+                os.fsync(f.fileno())
+
+    def records(self) -> Iterator[Dict]:
+        if not self.path.exists():
+            return
+        with open(self.path, 'rb') as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+
+    def completed(self) -> Tuple[Set[str], Dict[str, Dict[str, Dict[str, int]]]]:
+        """Finished packages, and the finished versions of each package with the output sizes after each one (in the
+        order they were recorded). Read once by main.py, the versions of each package are passed down to its analyzer"""
+        packages = set()
+        versions: Dict[str, Dict[str, Dict[str, int]]] = {}
+        for record in self.records():
+            if record.get('completed'):
+                packages.add(record['package'])
+            elif 'version' in record:
+                versions.setdefault(record['package'], {})[record['version']] = record['outputs']
+        return packages, versions
+
+    def record_version(self, package: str, version: str, output_dir: Path, output_files: Iterable[str]) -> None:
+        """Record a version whose rows were all written to the output files"""
+        outputs = {}
+        for name in output_files:
+            path = output_dir / name
+            if path.exists():
+                with open(path, 'rb') as f:
+                    os.fsync(f.fileno())
+                outputs[name] = path.stat().st_size
+        self._append({'package': package, 'version': version, 'outputs': outputs})
+
+    def record_package(self, package: str) -> None:
+        self._append({'package': package, 'completed': True})
+
+    def _append(self, record: Dict) -> None:
+        line = (json.dumps(record) + "\n").encode("utf8")
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, line)
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    @staticmethod
+    def truncate_outputs(output_dir: Path, outputs: Dict[str, int], output_files: Iterable[str]) -> None:
+        """Drop the rows written after the last finished version, files not written by then are removed
+        (so their header is written again)"""
+        for name in output_files:
+            path = output_dir / name
+            if not path.exists():
+                continue
+            size = outputs.get(name, 0)
+            if size == 0:
+                path.unlink()
+            elif path.stat().st_size > size:
+                os.truncate(path, size)
@@ -0,0 +1,18 @@
+from typing import Dict, Iterable, List
+
+class StringTable:
+    """Shared copy of repeated strings (matches, file type labels, package and version names), so equal strings kept by
+    many results are stored once. Unlike sys.intern the strings are released with the table"""
+
+    def __init__(self):
+        self._strings: Dict[str, str] = {}
+
+    def __len__(self) -> int:
+        return len(self._strings)
+
+    def get(self, value: str) -> str:
+        return self._strings.setdefault(value, value)
+
+    def strings(self, values: Iterable[str]) -> List[str]:
+        strings = self._strings
+        return [strings.setdefault(value, value) for value in values]
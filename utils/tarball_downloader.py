@@ -0,0 +1,127 @@
+import base64
+import hashlib
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+
+class IntegrityError(Exception):
+    pass
+
+class TarballDownloader:
+    """Concurrent tarball downloads over a shared keep-alive session, with a concurrency limit per host"""
+
+    # Strongest first, as npm does when dist.integrity lists several hashes
+    SRI_ALGORITHMS = ("sha512", "sha384", "sha256", "sha1")
+
+    # Connections kept alive per host by the shared session
+    POOL_SIZE = 32
+
+    # One session per process: connections must not be shared across fork
+    _session: Optional[requests.Session] = None
+    _session_pid: int = 0
+    _session_lock = threading.Lock()
+
+    def __init__(self, max_workers: int = 8, per_host: int = 4, timeout: float = 30, chunk_size: int = 64 * 1024):
+        self.max_workers = max(1, max_workers)
+        self.per_host = max(1, per_host)
+        self.timeout = timeout
+        self.chunk_size = chunk_size
+        self._host_limits: Dict[str, threading.Semaphore] = {}
+        self._host_limits_lock = threading.Lock()
+
+    @classmethod
+    def get_session(cls) -> requests.Session:
+        """Lazy initialization of the shared session (singleton pattern, per process)"""
+        with cls._session_lock:
+            if cls._session is None or cls._session_pid != os.getpid():
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=cls.POOL_SIZE, pool_maxsize=cls.POOL_SIZE)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                cls._session = session
+                cls._session_pid = os.getpid()
+            return cls._session
+
+    def _host_limit(self, url: str) -> threading.Semaphore:
+        host = urlsplit(url).netloc
+        with self._host_limits_lock:
+            if host not in self._host_limits:
+                self._host_limits[host] = threading.Semaphore(self.per_host)
+            return self._host_limits[host]
+
+    @classmethod
+    def expected_digest(cls, dist: Dict) -> Optional[Tuple[str, bytes]]:
+        """(algorithm, digest) to verify a tarball against, from dist.integrity (SRI) or the legacy dist.shasum"""
+        candidates = {}
+        for token in (dist.get('integrity') or '').split():
+            algorithm, _, value = token.partition('-')
+            if algorithm in cls.SRI_ALGORITHMS:
+                try:
+                    candidates[algorithm] = base64.b64decode(value.split('?')[0], validate=True)
+                except ValueError:
+                    continue
+        for algorithm in cls.SRI_ALGORITHMS:
+            if algorithm in candidates:
+                return algorithm, candidates[algorithm]
+        shasum = dist.get('shasum')
+        if shasum:
+            try:
+                return 'sha1', bytes.fromhex(shasum)
+            except ValueError:
+                pass
+        return None
+
+    @staticmethod
+    def file_matches(path: Path, expected: Tuple[str, bytes]) -> bool:
+        """Check an already downloaded tarball against its expected digest"""
+        algorithm, digest = expected
+        h = hashlib.new(algorithm)
+        try:
+            with open(path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1 << 20), b''):
+                    h.update(chunk)
+        except OSError:
+            return False
+        return h.digest() == digest
+
+    def download(self, url: str, destination: Path, expected: Optional[Tuple[str, bytes]] = None) -> None:
+        """Stream a single body to disk in chunks, verifying it in the same pass.
+        The body is written to a .part file and renamed only once it is complete and verified"""
+        session = self.get_session()
+        tmp_path = Path(f"{destination}.part")
+        h = hashlib.new(expected[0]) if expected else None
+        with self._host_limit(url):
+            try:
+                with session.get(url, timeout=self.timeout, stream=True) as response:
+                    response.raise_for_status()
+                    with open(tmp_path, 'wb') as f:
+                        for chunk in response.iter_content(chunk_size=self.chunk_size):
+                            f.write(chunk)
+                            if h is not None:
+                                h.update(chunk)
+                if h is not None and h.digest() != expected[1]:
+                    raise IntegrityError(f"{expected[0]} mismatch for {url}")
+                os.replace(tmp_path, destination)
+            except Exception:
+                tmp_path.unlink(missing_ok=True)
+                raise
+
+    def download_all(self, jobs: List[Tuple[str, Path, Optional[Tuple[str, bytes]]]]) -> Dict[Path, Optional[Exception]]:
+        """Download (url, destination, expected digest) jobs concurrently. Returns the error of each destination, None on success"""
+        def run(job: Tuple[str, Path, Optional[Tuple[str, bytes]]]) -> Optional[Exception]:
+            try:
+                self.download(*job)
+                return None
+            except Exception as e:
+                return e
+
+        if not jobs:
+            return {}
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(jobs))) as executor:
+            errors = list(executor.map(run, jobs))
+        return {destination: error for (_, destination, _), error in zip(jobs, errors)}
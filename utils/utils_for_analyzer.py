@@ -1,31 +1,235 @@
-from typing import List, Pattern, Tuple
-from utils import synchronized_print
+import mmap
+import re
 import signal
-from tree_sitter import Language, Parser
-import tree_sitter_typescript as tstypescript
+import threading
+import time
+from array import array
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Iterator, List, Optional, Pattern, Tuple, Union
+from utils import synchronized_print
+from .offset_map import OffsetMap
+from .parsed_file import ParsedFile
+
+try:
+    import re._parser as sre_parse
+    import re._constants as sre_constants
+except ImportError:     # Python < 3.11
+    import sre_parse
+    import sre_constants
 
 class UtilsForAnalyzer:
-    JS_LANGUAGE = Language(tstypescript.language_typescript())
+    JS_LANGUAGE = ParsedFile.JS_LANGUAGE
+
+    # Every comment of the grammar starts with one of these: comment is // or /* */, html_comment is <!-- or -->
+    COMMENT_OPENERS = re.compile(rb'//|/\*|<!--|-->')
+    # Node kinds whose name contains "comment", filled on first use
+    _comment_kind_ids = None
+
+    # Control characters that str patterns match with \s and str.splitlines treats as line breaks, unlike bytes
+    STR_ONLY_SEPARATORS = (b'\x1c', b'\x1d', b'\x1e', b'\x1f')
+    BYTE_CHECK_CHUNK = 1 << 20
+
+    # Characters scanned by each finditer call of detect_patterns_with_timeout, the deadline is checked between windows
+    SCAN_WINDOW = 64 * 1024
+    # Overlap of consecutive windows for patterns with unbounded quantifiers, matches crossing it are scanned again
+    UNBOUNDED_OVERLAP = 4 * 1024
+
+    @staticmethod
+    def is_byte_exact(buffer: Union[bytes, mmap.mmap]) -> bool:
+        """Whether the content can be analyzed as bytes with the same results as its decoded text:
+        ASCII (one byte per character) without the separators above. A mapped file is checked in chunks"""
+        if isinstance(buffer, bytes):
+            chunks = (buffer,)
+        else:
+            step = UtilsForAnalyzer.BYTE_CHECK_CHUNK
+            chunks = (buffer[start:start + step] for start in range(0, len(buffer), step))
+        for chunk in chunks:
+            if not chunk.isascii() or any(separator in chunk for separator in UtilsForAnalyzer.STR_ONLY_SEPARATORS):
+                return False
+        return True
     
     @staticmethod
-    def remove_comments(content: str, file_path_name: str) -> Tuple[str, int]:
+    def remove_comments(content: Union[str, bytes], file_path_name: str, parsed: Optional[ParsedFile] = None) -> Tuple[Union[str, bytes], int]:
         """Strips comments from JS/TS code while keeping the original layout intact.
-        Special handling is included to preserve Triple Slash Directives in .d.ts files."""
+        Special handling is included to preserve Triple Slash Directives in .d.ts files.
+        If the file was already parsed, its tree is reused. Bytes (or a mapped file) give bytes, without decoding."""
+        content, num_comments, _ = UtilsForAnalyzer.strip_comments(content, file_path_name, parsed)
+        return content, num_comments
+
+    @staticmethod
+    def strip_comments(content: Union[str, bytes], file_path_name: str, parsed: Optional[ParsedFile] = None) -> Tuple[Union[str, bytes], int, Optional[OffsetMap]]:
+        """Same as remove_comments, also returning the map from the stripped content back to the original one
+        (None only in the fallback described in _deleted_ranges). The map is also kept on the ParsedFile.
+        The output is built in a single forward pass from the kept slices of the original"""
+        is_text = isinstance(content, str)
         if not content:
-            return "", 0
+            return ("" if is_text else b""), 0, OffsetMap.identity(content)
 
-        parser = Parser(UtilsForAnalyzer.JS_LANGUAGE)
-        content_bytes = content.encode("utf8")
+        if parsed is None:
+            parsed = ParsedFile(content, file_path_name)
+        content_bytes = parsed.content_bytes
+        tree = parsed.tree
+        if tree is None:
+            parsed.offset_map = OffsetMap.identity(content)
+            # A mapped file is returned as bytes, it is unmapped after the analysis
+            return (content if is_text else bytes(content)), 0, parsed.offset_map
         
-        try:
-            tree = parser.parse(content_bytes)
-        except Exception:
-            return content, 0
+        is_index_d_ts = file_path_name.lower() == "index.d.ts"
+        comment_ranges = UtilsForAnalyzer._collect_comment_ranges(tree, content_bytes, is_index_d_ts)
+
+        if not comment_ranges:
+            parsed.offset_map = OffsetMap.identity(content)
+            return (content if is_text else bytes(content)), 0, parsed.offset_map
+
+        deleted = UtilsForAnalyzer._deleted_ranges(content_bytes, comment_ranges)
+        if deleted is None:
+            parsed.offset_map = None
+            stripped = UtilsForAnalyzer._delete_in_place(content_bytes, comment_ranges)
+            return (stripped.decode("utf8") if is_text else bytes(stripped)), len(comment_ranges), None
+
+        if is_text and len(content_bytes) != len(content):
+            deleted = UtilsForAnalyzer._to_char_ranges(content_bytes, deleted)
+
+        pieces = []
+        stripped_starts = array('q')
+        original_starts = array('q')
+        stripped_len = 0
+        kept_start = 0
+        for removed_start, removed_end in deleted + [(len(content), len(content))]:
+            if removed_start > kept_start:
+                pieces.append(content[kept_start:removed_start])
+                stripped_starts.append(stripped_len)
+                original_starts.append(kept_start)
+                stripped_len += removed_start - kept_start
+            kept_start = removed_end
+        if not pieces:
+            stripped_starts.append(0)
+            original_starts.append(len(content))
+
+        parsed.offset_map = OffsetMap(content, stripped_starts, original_starts)
+        return ("".join(pieces) if is_text else b"".join(pieces)), len(comment_ranges), parsed.offset_map
+
+    @staticmethod
+    def _deleted_ranges(content_bytes: bytes, comment_ranges: List[Tuple[int, int]]) -> Optional[List[Tuple[int, int]]]:
+        """Byte ranges of the original removed by the comment deletion, in document order.
+        Same result as deleting each comment from right to left in place (see _delete_in_place), computed without
+        moving bytes: the removed ranges are kept merged, so the byte that follows a comment once the comments on
+        its right are removed is found in constant time.
+        Returns None if a removal reaches into a comment on its left (only possible when a comment ends with
+        whitespace, e.g. on error recovery), where the in-place result depends on the shifted offsets."""
+        n = len(content_bytes)
+        deleted = []    # From right to left, never adjacent: the last one is the leftmost
+        for start, end in reversed(comment_ranges):
+            if deleted and deleted[-1][0] < end:
+                return None
+            following = deleted[-1][1] if deleted and deleted[-1][0] == end else end
+
+            # Check if the comment is on its own line to prevent leaving blank lines
+            has_newline_after = following < n and content_bytes[following] == 0x0A     # \n
+
+            # Look backwards to see if there's only whitespace before the comment on the same line
+            prefix_idx = start - 1
+            only_whitespace_before = True
+            while prefix_idx >= 0 and content_bytes[prefix_idx] != 0x0A:
+                if content_bytes[prefix_idx] not in (0x20, 0x09, 0x0D):     # space, \t, \r
+                    only_whitespace_before = False
+                    break
+                prefix_idx -= 1
+
+            if only_whitespace_before and has_newline_after:
+                # Full-line comment: remove the indentation and the trailing newline too
+                removed_start, removed_end = prefix_idx + 1, following + 1
+            else:
+                # Inline comment: just remove the comment text, leave the surrounding code
+                removed_start, removed_end = start, end
+            while deleted and deleted[-1][0] <= removed_end:
+                removed_end = max(removed_end, deleted.pop()[1])
+            deleted.append((removed_start, removed_end))
+        deleted.reverse()
+        return deleted
+
+    @staticmethod
+    def _to_char_ranges(content_bytes: bytes, byte_ranges: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+        """Byte ranges (on character boundaries) converted to character ranges, decoding each gap once"""
+        char_ranges = []
+        byte_pos = char_pos = 0
+        for start, end in byte_ranges:
+            start_char = char_pos + len(content_bytes[byte_pos:start].decode("utf8"))
+            end_char = start_char + len(content_bytes[start:end].decode("utf8"))
+            char_ranges.append((start_char, end_char))
+            byte_pos, char_pos = end, end_char
+        return char_ranges
+
+    @staticmethod
+    def _delete_in_place(content_bytes: bytes, comment_ranges: List[Tuple[int, int]]) -> bytearray:
+        """Previous implementation: one bytearray deletion per comment, quadratic on heavily commented files"""
+        # Use bytearray for efficient in-place deletions
+        new_content_bytes = bytearray(content_bytes)
+        
+        # Process ranges in reverse to keep byte offsets valid after each deletion
+        for start, end in reversed(comment_ranges):
+            # Check if the comment is on its own line to prevent leaving blank lines
+            has_newline_after = (end < len(new_content_bytes) and new_content_bytes[end:end+1] == b'\n')
+            
+            # Look backwards to see if there's only whitespace before the comment on the same line
+            prefix_idx = start - 1
+            only_whitespace_before = True
+            while prefix_idx >= 0 and new_content_bytes[prefix_idx:prefix_idx+1] != b'\n':
+                if new_content_bytes[prefix_idx:prefix_idx+1] not in [b' ', b'\t', b'\r']:
+                    only_whitespace_before = False
+                    break
+                prefix_idx -= 1
+
+            if only_whitespace_before and has_newline_after:
+                # Full-line comment: remove the indentation and the trailing newline too
+                actual_start = prefix_idx + 1 if prefix_idx >= 0 else 0
+                del new_content_bytes[actual_start : end + 1]
+            else:
+                # Inline comment: just remove the comment text, leave the surrounding code
+                del new_content_bytes[start:end]
         
+        return new_content_bytes
+
+    @staticmethod
+    def _collect_comment_ranges(tree, content_bytes: bytes, is_index_d_ts: bool) -> List[Tuple[int, int]]:
+        """Byte ranges of the comments in document order.
+        Candidate positions are found with a byte search for the comment openers and confirmed with a lookup
+        in the tree (C side), instead of visiting every node of the tree from Python"""
+        if UtilsForAnalyzer._comment_kind_ids is None:
+            language = UtilsForAnalyzer.JS_LANGUAGE
+            UtilsForAnalyzer._comment_kind_ids = frozenset(
+                i for i in range(language.node_kind_count) if "comment" in (language.node_kind_for_id(i) or "")
+            )
+        comment_kind_ids = UtilsForAnalyzer._comment_kind_ids
+        descendant = tree.root_node.descendant_for_byte_range
+        search = UtilsForAnalyzer.COMMENT_OPENERS.search
+
+        comment_ranges = []
+        opener = search(content_bytes)
+        while opener is not None:
+            pos = opener.start()
+            node = descendant(pos, opener.end())
+            if node is not None and node.kind_id in comment_kind_ids:
+                # Usually starts at pos, but error recovery may attach skipped bytes in front of the opener
+                end = node.end_byte
+                comment_ranges.append((node.start_byte, end))
+                # Comments do not nest, openers inside this one are text
+                opener = search(content_bytes, end if end > pos else pos + 1)
+            else:
+                opener = search(content_bytes, pos + 1)
+
+        if is_index_d_ts:
+            # In index.d.ts files, we must ignore '///' directives as they are functional
+            comment_ranges = [(start_b, end_b) for start_b, end_b in comment_ranges if content_bytes[start_b:start_b+3] != b"///"]
+        return comment_ranges
+
+    @staticmethod
+    def _collect_comment_ranges_walk(tree, content_bytes: bytes, is_index_d_ts: bool) -> List[Tuple[int, int]]:
+        """Previous implementation, a Python walk over every node. Kept as reference for benchmark_comments.py"""
         comment_ranges = []
         cursor = tree.walk()
         reached_root = False
-        is_index_d_ts = file_path_name.lower() == "index.d.ts"
 
         # Walk the AST iteratively to avoid stack overflow on massive files
         while not reached_root:
@@ -54,72 +258,171 @@ class UtilsForAnalyzer:
                     retracing = False
                 if cursor.goto_next_sibling():
                     retracing = False
-
-        if not comment_ranges:
-            return content, 0
-
-        # Use bytearray for efficient in-place deletions
-        new_content_bytes = bytearray(content_bytes)
-        
-        # Process ranges in reverse to keep byte offsets valid after each deletion
-        for start, end in reversed(comment_ranges):
-            # Check if the comment is on its own line to prevent leaving blank lines
-            has_newline_after = (end < len(new_content_bytes) and new_content_bytes[end:end+1] == b'\n')
-            
-            # Look backwards to see if there's only whitespace before the comment on the same line
-            prefix_idx = start - 1
-            only_whitespace_before = True
-            while prefix_idx >= 0 and new_content_bytes[prefix_idx:prefix_idx+1] != b'\n':
-                if new_content_bytes[prefix_idx:prefix_idx+1] not in [b' ', b'\t', b'\r']:
-                    only_whitespace_before = False
-                    break
-                prefix_idx -= 1
-
-            if only_whitespace_before and has_newline_after:
-                # Full-line comment: remove the indentation and the trailing newline too
-                actual_start = prefix_idx + 1 if prefix_idx >= 0 else 0
-                del new_content_bytes[actual_start : end + 1]
-            else:
-                # Inline comment: just remove the comment text, leave the surrounding code
-                del new_content_bytes[start:end]
-        
-        return new_content_bytes.decode("utf8"), len(comment_ranges)
-
+        return comment_ranges
      
     @staticmethod
-    def detect_patterns_with_timeout(content: str, patterns: List[Pattern], timeout_seconds: int = 5) -> Tuple[int, List[str]]:
-        """Detect patterns with timeout protection"""
-        matches = []
-        
-        def timeout_handler(signum, frame):
-            raise TimeoutError("Regex timeout")
+    def detect_patterns_with_timeout(content: str, patterns: List[Pattern], timeout_seconds: float = 5, deadline: Optional[float] = None,
+                                     max_matches: Optional[int] = None, into: Optional[List[str]] = None) -> Tuple[int, List[str]]:
+        """Detect patterns within a time budget shared by all the patterns: timeout_seconds from now, or a deadline
+        (time.monotonic) shared with other calls, e.g. all the patterns scanned on a file (see PatternSet.scan).
+        The content is scanned in windows of SCAN_WINDOW characters and the budget is checked between windows and
+        matches, without signals, so it works in any thread and a pattern that finds nothing is stopped too.
+        A single match attempt is still bounded only by the window (see regex_interrupt and the notes at the end of
+        this file). max_matches caps the matches of each pattern, None for no cap.
+        The matches are appended to into if given (a list, or anything with append and len, e.g. a MatchTally)"""
+        matches = [] if into is None else into
+        if deadline is None:
+            deadline = time.monotonic() + timeout_seconds
         
         for pattern in patterns:
+            if time.monotonic() > deadline:
+                synchronized_print(f"    Regex timeout, pattern skipped: {pattern.pattern[:50]}...")
+                continue
             try:
-                # Set timeout
-                signal.signal(signal.SIGALRM, timeout_handler)
-                signal.alarm(timeout_seconds)
-                
-                for match in pattern.finditer(content):
-                    matches.append(match.group(0))
-                
-                # Cancel timeout
-                signal.alarm(0)
+                found = 0
+                for match in UtilsForAnalyzer._window_matches(pattern, content, deadline):
+                    matches.append(match)
+                    found += 1
+                    if found == max_matches:
+                        break
                 
             except TimeoutError:
-                signal.alarm(0)
                 synchronized_print(f"    Regex timeout on pattern: {pattern.pattern[:50]}...")
-                # Continue with other patterns
+                # The budget is spent, the remaining patterns are skipped
                 
             except Exception as e:
-                signal.alarm(0)
                 synchronized_print(f"    Regex error: {e}")
 
         return len(matches), matches
+
+    @staticmethod
+    def _window_matches(pattern: Pattern, content: Union[str, bytes], deadline: float) -> Iterator[Union[str, bytes]]:
+        """Same matches as pattern.finditer(content), found one window at a time. Consecutive windows overlap by the
+        reach of the pattern, and only the matches whose attempt cannot see the end of the window are kept, the others
+        are found again by the next window. Raises TimeoutError past the deadline"""
+        reach = UtilsForAnalyzer.match_reach(pattern)
+        overlap = reach if reach is not None else UtilsForAnalyzer.UNBOUNDED_OVERLAP
+        # Empty matches depend on the previous match, which another window does not know: a single window
+        size = UtilsForAnalyzer.SCAN_WINDOW if UtilsForAnalyzer.min_width(pattern) else len(content)
+        pos = 0
+        while True:
+            if time.monotonic() > deadline:
+                raise TimeoutError()
+            end = min(len(content), pos + size + overlap)
+            last = end == len(content)
+            # Attempts starting before limit do not read past the end of the window
+            limit = end if last else end - overlap
+            next_pos = limit
+            for match in pattern.finditer(content, pos, end):
+                if not last:
+                    if match.start() >= limit:
+                        break
+                    if reach is None and match.end() > limit:
+                        # It may continue in the next window
+                        next_pos = match.start()
+                        break
+                yield match.group(0)
+                next_pos = max(limit, match.end())
+                if time.monotonic() > deadline:
+                    raise TimeoutError()
+            if last:
+                return
+            # A match longer than the window is scanned again with a larger window
+            size = size * 2 if next_pos == pos else UtilsForAnalyzer.SCAN_WINDOW
+            pos = next_pos
+
+    @staticmethod
+    @lru_cache(maxsize=None)
+    def match_reach(pattern: Pattern) -> Optional[int]:
+        """Characters a match attempt can read from where it starts, lookaheads and anchors included. None if unbounded"""
+        try:
+            parsed = sre_parse.parse(pattern.pattern, pattern.flags)
+        except Exception:
+            return None
+        width_reach = UtilsForAnalyzer._width_reach(parsed)
+        return width_reach[1] if width_reach is not None else None
+
+    @staticmethod
+    @lru_cache(maxsize=None)
+    def min_width(pattern: Pattern) -> int:
+        try:
+            return sre_parse.parse(pattern.pattern, pattern.flags).getwidth()[0]
+        except Exception:
+            return 0
+
+    @staticmethod
+    def _width_reach(items) -> Optional[Tuple[int, int]]:
+        """(maximum width, maximum reach) of a parsed sequence, None if unbounded"""
+        width = reach = 0
+        for op, av in items:
+            if op in (sre_constants.LITERAL, sre_constants.NOT_LITERAL, sre_constants.ANY, sre_constants.IN):
+                item = (1, 1)
+            elif op is sre_constants.AT:
+                # \b, \B and $ look at the next character
+                item = (0, 1)
+            elif op is sre_constants.SUBPATTERN:
+                item = UtilsForAnalyzer._width_reach(av[3])
+            elif op is getattr(sre_constants, 'ATOMIC_GROUP', None):
+                item = UtilsForAnalyzer._width_reach(av)
+            elif op in (sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT, getattr(sre_constants, 'POSSESSIVE_REPEAT', None)):
+                _, high, sub = av
+                sub = UtilsForAnalyzer._width_reach(sub)
+                if sub is None or high == sre_constants.MAXREPEAT:
+                    return None
+                item = (high * sub[0], (high - 1) * sub[0] + sub[1]) if high else (0, 0)
+            elif op is sre_constants.BRANCH:
+                branches = [UtilsForAnalyzer._width_reach(branch) for branch in av[1]]
+                if None in branches:
+                    return None
+                item = (max(b[0] for b in branches), max(b[1] for b in branches))
+            elif op in (sre_constants.ASSERT, sre_constants.ASSERT_NOT):
+                direction, sub = av
+                # Lookbehinds read before the start, which every window can see
+                sub = UtilsForAnalyzer._width_reach(sub) if direction > 0 else (0, 0)
+                if sub is None:
+                    return None
+                item = (0, sub[1])
+            else:
+                # Backreferences, conditionals
+                return None
+            if item is None:
+                return None
+            reach = max(reach, width + item[1])
+            width += item[0]
+        return width, reach
+
+    @staticmethod
+    @contextmanager
+    def regex_interrupt(deadline: float) -> Iterator[None]:
+        """Interrupt a match attempt still running at the deadline, which the checks between windows cannot do
+        (catastrophic backtracking). Only on the main thread, where signals are delivered, e.g. in the worker
+        processes: a single timer for the whole block, in fractions of a second. Elsewhere it does nothing"""
+        if not hasattr(signal, 'setitimer') or threading.current_thread() is not threading.main_thread():
+            yield
+            return
+
+        armed = [True]
+
+        def on_timer(signum, frame):
+            if armed[0]:
+                raise TimeoutError("Regex timeout")
+
+        previous = signal.signal(signal.SIGALRM, on_timer)
+        try:
+            signal.setitimer(signal.ITIMER_REAL, max(deadline - time.monotonic(), 0.001))
+            yield
+        except TimeoutError:
+            # Raised outside of a scan, the remaining patterns see the deadline as passed
+            pass
+        finally:
+            armed[0] = False
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            signal.signal(signal.SIGALRM, previous)
     
     @staticmethod
-    def detect_patterns(content: str, patterns: List[Pattern]) -> Tuple[int, List[str]]:
-        return UtilsForAnalyzer.detect_patterns_with_timeout(content, patterns, timeout_seconds=5)
+    def detect_patterns(content: str, patterns: List[Pattern], deadline: Optional[float] = None, max_matches: Optional[int] = None,
+                        into: Optional[List[str]] = None) -> Tuple[int, List[str]]:
+        return UtilsForAnalyzer.detect_patterns_with_timeout(content, patterns, timeout_seconds=5, deadline=deadline, max_matches=max_matches, into=into)
     
     '''
     @staticmethod